@@ -1,40 +1,90 @@
-import time 
 import os
-from datetime import datetime
-from flask import Flask, jsonify, request, session, render_template, g
-from flask_socketio import SocketIO, emit
 from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Green-thread servers (multi-worker mode) must patch the standard library before anything else is imported
+if os.environ.get('SOCKETIO_ASYNC_MODE') == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif os.environ.get('SOCKETIO_ASYNC_MODE') == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+import time 
+from datetime import datetime
+from flask import Flask, Response, jsonify, request, send_file, session, g, stream_with_context
+from flask_socketio import SocketIO, emit, join_room
+from sqlalchemy.engine import Engine
 from database import db, User, Conversation, Message, Badge
 from groqChatbot import llm_chatbot 
+from llm_client import LLMError
 from video_analysis.video_analysis import analyze_video_frame
+from video_analysis.classroom import FaceTracker, analyze_classroom_frame
+from video_analysis.recorder import create_recorder
+from metrics import init_metrics, VIDEO_FRAMES_RECEIVED, VIDEO_FRAMES_PROCESSED, VIDEO_FRAMES_DROPPED, VIDEO_FRAME_LATENCY
+from assets import StaticPageCache, init_static_assets
+from compression import init_compression
+from session_cache import UserCache, UserSnapshot, create_backend, issue_socket_token, verify_socket_token
+from semantic_cache import create_semantic_cache
+from scale_out import socketio_options, is_multi_worker, user_room
+from search import setup_search_index, search_messages
+from archive import init_archive_cli, iter_export_records, ndjson_lines, rehydrate_conversation, write_parquet_tempfile
+from tts_pipeline import SentenceChunker, IncrementalSpeaker, split_into_sentences
 import pyttsx3
 import threading
 
 # Set this environment variable for local testing with HTTP
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
-# Load environment variables
-load_dotenv()
-
 # Create the Flask app instance
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET_KEY', 'a-default-secret-key')
 
-# Configure SQLite database
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///site.db'
+# Configure SQLite database (DATABASE_URL points all workers at a shared server database)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///site.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Initialize database with the app.py
 db.init_app(app)
 
+# Cold storage for archived conversations (`flask archive`); `flask export` streams NDJSON/Parquet
+app.config['ARCHIVE_DIR'] = os.environ.get('ARCHIVE_DIR', os.path.join(app.instance_path, 'archive'))
+init_archive_cli(app)
+
+# Request latency/in-flight/DB-query metrics and the /metrics endpoint.
+# Registered before load_user so its user query is counted too.
+init_metrics(app, engine_class=Engine)
+
+# Fingerprinted bundles from `python assets.py` get long-lived cache headers;
+# HTML/JSON/CSS/JS responses above 1 KB are gzip/brotli compressed
+init_static_assets(app)
+init_compression(app)
+page_cache = StaticPageCache()
+
+# Opt-in (SEMANTIC_CACHE_ENABLED=1) per-topic cache of answers to near-identical questions
+semantic_cache = create_semantic_cache()
+
+# Identity cache: compact user snapshots so authenticated requests skip the user query.
+# SESSION_CACHE_URL=redis://... shares it (and its invalidations) across workers.
+user_cache = UserCache(create_backend(os.environ.get('SESSION_CACHE_URL')),
+                       ttl=int(os.environ.get('SESSION_CACHE_TTL', 300)))
+
 # Wrap Flask app with SocketIO - CORS enabled
-# Using eventlet for asynchronous support for real-time video/audio streams
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# Single process with threading by default; set SOCKETIO_ASYNC_MODE=eventlet/gevent and
+# SOCKETIO_MESSAGE_QUEUE to run several workers behind a sticky load balancer (see README)
+socketio = SocketIO(app, cors_allowed_origins="*", **socketio_options())
+
+# pyttsx3 speaks on the host of whichever worker handles the request, and a stop request
+# may land on a different worker, so server-side speech is single-process only
+SERVER_TTS_ENABLED = os.environ.get('SERVER_TTS_ENABLED', '0' if is_multi_worker() else '1') == '1'
 
 # Function to create database tables
 def create_db():
     with app.app_context():
         db.create_all()
+        setup_search_index()
         # Check if badges exist; if not, seed them
         if not Badge.query.first():
             print("Seeding Gem Gallery with Difficulty Badges...")
@@ -58,15 +108,33 @@ def create_db():
             db.session.commit()
         print("Database tables created!")
 
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing tables and the search index, and seed the badges."""
+    create_db()
+
+# Tables added after a database was first created (conversation_archive, the search index)
+# are created on startup, so `gunicorn app:app` works on an existing site.db.
+# With several workers starting at once set DB_AUTO_CREATE=0 and run `flask init-db` once.
+if os.environ.get('DB_AUTO_CREATE', '1') == '1':
+    create_db()
+
 def get_current_user():
-    user_id = session.get('user_id')
-    if user_id:
-        return User.query.get(user_id)
-    return None
+    # ORM user for handlers that write to it; loaded at most once per request
+    if 'orm_user' not in g:
+        user_id = session.get('user_id')
+        g.orm_user = User.query.get(user_id) if user_id else None
+    return g.orm_user
+
+def load_user_snapshot(user_id):
+    user = User.query.get(user_id)
+    return UserSnapshot.from_user(user) if user else None
 
 @app.before_request
 def load_user():
-    g.user = get_current_user()
+    # g.user is a read-only UserSnapshot served from the identity cache
+    user_id = session.get('user_id')
+    g.user = user_cache.get(user_id, load_user_snapshot) if user_id else None
 
 def login_required(f):
     def decorated_function(*args, **kwargs):
@@ -80,11 +148,11 @@ def login_required(f):
 # Rendering index.html
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return page_cache.response('index.html')
 
 @app.route('/check_session')
 def check_session():
-    user = get_current_user()
+    user = g.user
     if user:
         return jsonify({
             'is_authenticated': True, 
@@ -127,7 +195,7 @@ def update_profile():
     dislikes = data.get('dislikes')
     context = data.get('context')
 
-    user = g.user 
+    user = get_current_user()
     if likes is not None:
         user.likes = ','.join(likes) if isinstance(likes, list) else likes
     if dislikes is not None:
@@ -136,6 +204,7 @@ def update_profile():
         user.context = context
 
     db.session.commit()
+    user_cache.invalidate(user.id)
 
     return jsonify({'success': True, 'message': 'Profile updated successfully'}), 200
 
@@ -156,6 +225,12 @@ def login():
     else:
         return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
 
+@app.route('/api/socket_token', methods=['GET'])
+@login_required
+def socket_token():
+    # Signed, expiring token the SocketIO handshake verifies without a DB lookup
+    return jsonify({'success': True, 'token': issue_socket_token(app.config['SECRET_KEY'], session['user_id'])}), 200
+
 @app.route('/logout')
 def logout():
     session.pop('user_id', None)
@@ -165,7 +240,7 @@ def logout():
 @app.route('/gamification')
 @login_required
 def gamification():
-    return render_template('gamification.html')
+    return page_cache.response('gamification.html')
 
 @app.route('/api/gamification/stats', methods=['GET'])
 @login_required
@@ -183,20 +258,22 @@ def get_gamification_stats():
 @login_required
 def earn_rewards():
     data = request.get_json()
-    g.user.xp += data.get('xp', 0)
-    g.user.opal_gems += data.get('gems', 0)
+    user = get_current_user()
+    user.xp += data.get('xp', 0)
+    user.opal_gems += data.get('gems', 0)
     
     leveled_up = False
-    while g.user.xp >= (g.user.level * 100):
-        g.user.xp -= (g.user.level * 100)
-        g.user.level += 1
-        g.user.opal_gems += 20  # Bonus gems for leveling up
+    while user.xp >= (user.level * 100):
+        user.xp -= (user.level * 100)
+        user.level += 1
+        user.opal_gems += 20  # Bonus gems for leveling up
         leveled_up = True
     
     db.session.commit()
+    user_cache.invalidate(user.id)
     return jsonify({
         'success': True,
-        'new_level': g.user.level,
+        'new_level': user.level,
         'leveled_up': leveled_up
     })
 
@@ -204,7 +281,7 @@ def earn_rewards():
 @login_required
 def badge_gallery():
     badges = Badge.query.all()
-    user_badge_ids = [b.id for b in g.user.badges]
+    user_badge_ids = set(g.user.badge_ids)
     badge_data = [{
         'id': b.id,
         'name': b.name,
@@ -220,18 +297,20 @@ def badge_gallery():
 @app.route('/api/gamification/buy/<int:badge_id>', methods=['POST'])
 @login_required
 def buy_badge(badge_id):
+    user = get_current_user()
     badge = Badge.query.get(badge_id)
-    if not badge or badge in g.user.badges:
+    if not badge or badge in user.badges:
         return jsonify({'success': False, 'message': 'Invalid badge or already owned'}), 400
-    if g.user.opal_gems < badge.cost:
+    if user.opal_gems < badge.cost:
         return jsonify({'success': False, 'message': 'Not enough Opal Gems'}), 400
     
-    g.user.opal_gems -= badge.cost
-    g.user.badges.append(badge)
+    user.opal_gems -= badge.cost
+    user.badges.append(badge)
     db.session.commit()
+    user_cache.invalidate(user.id)
     return jsonify({
         'success': True,
-        'new_gems': g.user.opal_gems,
+        'new_gems': user.opal_gems,
         'message': f'Unlocked {badge.name}!'
     })
 
@@ -263,6 +342,9 @@ def generate_quiz():
         else:
             return jsonify({'success': False, 'message': 'AI failed to format quiz.'}), 500
 
+    except LLMError as e:
+        print(f"Quiz LLM Error ({e.code}): {e}")
+        return jsonify({'success': False, 'message': 'The quiz generator is temporarily unavailable. Please try again shortly.', 'error': e.code}), 503
     except Exception as e:
         print(f"Quiz Server Error: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -307,18 +389,59 @@ def chat_message():
         'session_topic': session_topic
     }
 
-    try:
-        llm_response_content = llm_chatbot.get_response(
-            conversation_id, 
-            message_content, 
-            user_data
-        )
-    except Exception as e:
-        print(f"Global Chatbot Execution Failed: {e}. Falling back to generic response.")
-        llm_response_content = None 
+    # Optional server-side speech: sentences are spoken while the LLM is still streaming
+    speaker = None
+    on_chunk = None
+    if data.get('speak') and SERVER_TTS_ENABLED:
+        speaker = start_incremental_speech()
+        chunker = SentenceChunker()
+        on_chunk = lambda delta: speaker.extend(chunker.feed(delta))
+
+    # Only conversations with a topic are cached; answers are shared within that topic
+    # between students with the same profile (context and likes) who were answering the same previous turn
+    use_cache = semantic_cache is not None and conversation.topic is not None
+    previous_answer = llm_chatbot.last_reply(conversation_id) if use_cache else None
+    cached_response = None
+    llm_error = None
+    if use_cache:
+        cached_response = semantic_cache.lookup(session_topic, message_content, g.user.username, emotion_detected,
+                                                context=context_text, likes=likes_text,
+                                                previous_answer=previous_answer)
+
+    if cached_response:
+        llm_response_content = cached_response
+        llm_chatbot.remember_exchange(conversation_id, message_content, cached_response)
+        if speaker:
+            on_chunk(cached_response)
+    else:
+        try:
+            llm_response_content = llm_chatbot.get_response(
+                conversation_id, 
+                message_content, 
+                user_data,
+                on_chunk=on_chunk
+            )
+        except LLMError as e:
+            print(f"Global Chatbot Execution Failed ({e.code}): {e}. Falling back to generic response.")
+            llm_error = e
+            llm_response_content = None 
+        except Exception as e:
+            # Anything else (prompt building, TTS callback) still gets the canned reply, not a 500
+            print(f"Global Chatbot Execution Failed: {e}. Falling back to generic response.")
+            llm_error = LLMError(str(e), cause=e)
+            llm_response_content = None
+
+    if speaker:
+        speaker.extend(chunker.flush())
+        speaker.close()
 
     # START OF LLM FALLBACK LOGIC
-    if not llm_response_content or llm_response_content.isspace() or 'I apologize, ' in llm_response_content:
+    llm_failed = llm_error is not None or not llm_response_content or llm_response_content.isspace()
+    if use_cache and not cached_response and not llm_failed:
+        semantic_cache.store(session_topic, message_content, llm_response_content, g.user.username,
+                             conversation_id, emotion_detected, context=context_text, likes=likes_text,
+                             previous_answer=previous_answer)
+    if llm_failed:
         llm_response_content = (
             f"It seems like we're experiencing a technical issue. Don't worry, let's try to resolve this together. The error message is indicating a problem with the LLM API configuration or connectivity. I'm here to help you navigate through any challenges that come up. How would you like to proceed?"
         )
@@ -335,7 +458,9 @@ def chat_message():
     return jsonify({
         'success': True, 
         'vta_response': llm_response_content,
-        'message_id': vta_message.id
+        'message_id': vta_message.id,
+        'cached': bool(cached_response),
+        'error': llm_error.code if llm_error else None
     }), 200
 
 @app.route('/api/profile', methods=['GET'])
@@ -383,6 +508,10 @@ def set_session_topic(session_id):
     if not conversation:
         return jsonify({'success': False, 'message': 'Conversation not found'}), 404
     
+    # Answers this conversation contributed under its old topic no longer belong there
+    if semantic_cache is not None and conversation.topic and conversation.topic != topic:
+        semantic_cache.invalidate_conversation(conversation.id)
+
     # Update conversation topic and title
     conversation.topic = topic
     conversation.title = f"{topic[:50]}..." if len(topic) > 50 else topic
@@ -442,7 +571,9 @@ def get_session_messages(session_id):
 
     if not conversation:
         return jsonify({'success': False, 'message': 'Conversation not found'}), 404
-        
+
+    # Archived conversations are moved back into the hot table on first access
+    rehydrate_conversation(session_id)
     messages = Message.query.filter_by(conversation_id=session_id).order_by(Message.timestamp.asc()).all()
     
     message_list = [{
@@ -461,11 +592,46 @@ def get_session_messages(session_id):
         'topic_set': conversation.topic is not None
     }), 200
 
+@app.route('/api/export', methods=['GET'])
+@login_required
+def export_history():
+    export_format = request.args.get('format', 'ndjson')
+    records = iter_export_records(user_ids=[g.user.id])
+
+    if export_format == 'ndjson':
+        # Streamed in chunks; the request context stays open for the DB cursor
+        return Response(stream_with_context(ndjson_lines(records)), mimetype='application/x-ndjson',
+                        headers={'Content-Disposition': 'attachment; filename=vta-export.ndjson'})
+
+    if export_format == 'parquet':
+        try:
+            path = write_parquet_tempfile(records)
+        except RuntimeError as e:
+            return jsonify({'success': False, 'message': str(e)}), 501
+        response = send_file(path, mimetype='application/vnd.apache.parquet', as_attachment=True,
+                             download_name='vta-export.parquet')
+        response.call_on_close(lambda: os.remove(path))
+        return response
+
+    return jsonify({'success': False, 'message': 'Unsupported export format'}), 400
+
+@app.route('/api/search', methods=['GET'])
+@login_required
+def search_history():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'message': 'Search query is required'}), 400
+
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    return jsonify({'success': True, 'query': query, **search_messages(g.user.id, query, page, per_page)}), 200
+
 # Text-to-Speech Endpoint with pyttsx3
 # Global TTS engine and control
 tts_engine = None
 tts_lock = threading.Lock()
 is_speaking = False
+tts_speaker = None  # IncrementalSpeaker for the sentence-chunked mode
 
 def init_tts_engine():
     global tts_engine
@@ -473,17 +639,36 @@ def init_tts_engine():
         tts_engine = pyttsx3.init()
         tts_engine.setProperty('rate', 150)  # Speed
         tts_engine.setProperty('volume', 1.0)  # Volume
+    return tts_engine
+
+def start_incremental_speech():
+    # Only one reply is read aloud at a time; a new one interrupts the previous
+    global tts_speaker
+    if tts_speaker:
+        tts_speaker.stop()
+    tts_speaker = IncrementalSpeaker(init_tts_engine, lock=tts_lock)
+    return tts_speaker
 
 @app.route('/api/tts/speak', methods=['POST'])
 @login_required
 def text_to_speech_speak():
     global is_speaking
+    if not SERVER_TTS_ENABLED:
+        return jsonify({'success': False, 'message': 'Server-side TTS is disabled in multi-worker mode'}), 503
     try:
         data = request.get_json()
         text = data.get('text', '')
         
         if not text:
             return jsonify({'success': False, 'message': 'No text provided'}), 400
+
+        # Incremental mode: markdown stripped, spoken sentence by sentence
+        if data.get('incremental'):
+            speaker = start_incremental_speech()
+            chunks = split_into_sentences(text)
+            speaker.extend(chunks)
+            speaker.close()
+            return jsonify({'success': True, 'chunks': len(chunks)}), 200
         
         # Initialize engine if needed
         init_tts_engine()
@@ -514,8 +699,11 @@ def text_to_speech_speak():
 @app.route('/api/tts/stop', methods=['POST'])
 @login_required
 def text_to_speech_stop():
-    global is_speaking, tts_engine
+    global is_speaking, tts_engine, tts_speaker
     try:
+        if tts_speaker:
+            tts_speaker.stop()
+            tts_speaker = None
         if is_speaking and tts_engine:
             # Force stop the engine
             try:
@@ -532,18 +720,89 @@ def text_to_speech_stop():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 # SOCKETIO (Real-Time Emotion Detection) 
+# SOCKETIO_REQUIRE_AUTH=1 rejects sockets without a valid token or login session
+SOCKETIO_REQUIRE_AUTH = os.environ.get('SOCKETIO_REQUIRE_AUTH', '0') == '1'
+
+@socketio.on('connect')
+def handle_connect(auth=None):
+    # Authenticate once per connection: signed token first, then the login cookie; no DB hit
+    user_id = verify_socket_token(app.config['SECRET_KEY'], (auth or {}).get('token')) or session.get('user_id')
+    if SOCKETIO_REQUIRE_AUTH and not user_id:
+        return False
+    if user_id:
+        # Connection-scoped socket session, read by the event handlers
+        session['user_id'] = user_id
+        # Per-user room so server push events reach the user on any worker
+        join_room(user_room(user_id))
+
+# Opt-in frame recorder (VIDEO_RECORD_PATH) for replaying sessions with video_analysis/replay.py
+frame_recorder = create_recorder()
+
+# Sentinel labels returned by analyze_video_frame -> dropped-frame reason
+VIDEO_ERROR_LABELS = {'Model Error': 'model', 'Analysis Error': 'analysis', 'Prediction Error': 'prediction'}
+
 @socketio.on('video_stream')
 def handle_video_stream(data):
+    started = time.perf_counter()
+    VIDEO_FRAMES_RECEIVED.inc()
     base64_frame = data.get('frame')
     
     if base64_frame:
         detected_emotion = analyze_video_frame(base64_frame)
     else:
         detected_emotion = 'Neutral'
+
+    if not base64_frame:
+        VIDEO_FRAMES_DROPPED.inc(reason='empty')
+    elif detected_emotion in VIDEO_ERROR_LABELS:
+        VIDEO_FRAMES_DROPPED.inc(reason=VIDEO_ERROR_LABELS[detected_emotion])
+    else:
+        VIDEO_FRAMES_PROCESSED.inc()
         
     emit('video_response', {'emotion': detected_emotion})
+    VIDEO_FRAME_LATENCY.observe(time.perf_counter() - started)
+    if frame_recorder:
+        # Stamped with the arrival time so a slow server does not distort the recorded cadence
+        frame_recorder.record(request.sid, base64_frame, detected_emotion, received_at=started)
+
+# Classroom-camera mode: one FaceTracker per connected camera keeps face ids stable across frames
+classroom_trackers = {}
+
+@socketio.on('classroom_stream')
+def handle_classroom_stream(data):
+    started = time.perf_counter()
+    VIDEO_FRAMES_RECEIVED.inc()
+    base64_frame = data.get('frame')
+    if not base64_frame:
+        VIDEO_FRAMES_DROPPED.inc(reason='empty')
+        return
+
+    tracker = classroom_trackers.setdefault(request.sid, FaceTracker())
+    # Handlers run in their own threads; a frame arriving while the previous one of this
+    # camera is still being analyzed is dropped rather than racing it on the tracker
+    if not tracker.busy.acquire(blocking=False):
+        VIDEO_FRAMES_DROPPED.inc(reason='busy')
+        return
+    try:
+        result = analyze_classroom_frame(base64_frame, tracker)
+    finally:
+        tracker.busy.release()
+    if 'error' in result:
+        VIDEO_FRAMES_DROPPED.inc(reason=VIDEO_ERROR_LABELS.get(result['error'], 'analysis'))
+    else:
+        VIDEO_FRAMES_PROCESSED.inc()
+    emit('classroom_response', result)
+    if frame_recorder:
+        # Recorded with the room's dominant emotion; replay with --event classroom_stream
+        frame_recorder.record(request.sid, base64_frame, result.get('error') or result['room']['dominant_emotion'] or 'Neutral',
+                              received_at=started)
+
+@socketio.on('disconnect')
+def handle_disconnect(*args):
+    classroom_trackers.pop(request.sid, None)
+    if frame_recorder:
+        frame_recorder.forget(request.sid)
 
 
 if __name__ == '__main__':
-    create_db()
     socketio.run(app, debug=True, allow_unsafe_werkzeug=True)
\ No newline at end of file
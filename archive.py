@@ -0,0 +1,280 @@
+import os
+import sys
+import gzip
+import json
+import time
+import tempfile
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import click
+from flask import current_app
+from sqlalchemy import func, insert, select
+
+from database import db, User, Conversation, Message, ConversationArchive
+from metrics import registry
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+ARCHIVE_EVENTS = registry.counter('vta_archive_events_total', 'Conversations archived to or rehydrated from cold storage.', ('event',))
+
+EXPORT_CHUNK_SIZE = 1000
+DEFAULT_ARCHIVE_AFTER_DAYS = 180
+
+
+def archive_dir() -> str:
+    return current_app.config.get('ARCHIVE_DIR') or os.path.join(current_app.instance_path, 'archive')
+
+
+def _read_archive(relative_path: str) -> Dict[str, Any]:
+    with gzip.open(os.path.join(archive_dir(), relative_path), 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _remove_archive_file(relative_path: str) -> None:
+    try:
+        os.remove(os.path.join(archive_dir(), relative_path))
+    except FileNotFoundError:
+        pass
+
+
+# --- EXPORT ---
+def iter_export_records(user_ids: Optional[List[int]] = None, since: Optional[datetime] = None,
+                        until: Optional[datetime] = None, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Yields one flat record per message, hot tables first and then archived conversations.
+    Rows are fetched chunk_size at a time (a server-side cursor on PostgreSQL), so memory
+    stays constant however many messages are exported.
+    """
+    stmt = (select(Message.id, Message.conversation_id, Message.sender, Message.content,
+                   Message.emotion_detected, Message.timestamp, Conversation.user_id,
+                   Conversation.title, Conversation.topic, User.username)
+            .join(Conversation, Conversation.id == Message.conversation_id)
+            .join(User, User.id == Conversation.user_id)
+            .order_by(Message.id))
+    if user_ids:
+        stmt = stmt.where(Conversation.user_id.in_(user_ids))
+    if since:
+        stmt = stmt.where(Message.timestamp >= since)
+    if until:
+        stmt = stmt.where(Message.timestamp < until)
+
+    for row in db.session.execute(stmt.execution_options(yield_per=chunk_size)):
+        yield {
+            'user_id': row.user_id, 'username': row.username, 'conversation_id': row.conversation_id,
+            'conversation_title': row.title, 'topic': row.topic, 'message_id': row.id, 'sender': row.sender,
+            'content': row.content, 'emotion': row.emotion_detected,
+            'timestamp': row.timestamp.isoformat() if row.timestamp else None, 'archived': False,
+        }
+
+    archived = (select(ConversationArchive.path, Conversation.id, Conversation.user_id, Conversation.title,
+                       Conversation.topic, User.username)
+                .join(Conversation, Conversation.id == ConversationArchive.conversation_id)
+                .join(User, User.id == Conversation.user_id)
+                .order_by(Conversation.id))
+    if user_ids:
+        archived = archived.where(Conversation.user_id.in_(user_ids))
+
+    for row in db.session.execute(archived.execution_options(yield_per=chunk_size)):
+        # One conversation's file at a time
+        for m in _read_archive(row.path)['messages']:
+            timestamp = datetime.fromisoformat(m['timestamp']) if m['timestamp'] else None
+            if (since and (timestamp is None or timestamp < since)) or (until and (timestamp is None or timestamp >= until)):
+                continue
+            yield {
+                'user_id': row.user_id, 'username': row.username, 'conversation_id': row.id,
+                'conversation_title': row.title, 'topic': row.topic, 'message_id': m['id'], 'sender': m['sender'],
+                'content': m['content'], 'emotion': m['emotion_detected'], 'timestamp': m['timestamp'],
+                'archived': True,
+            }
+
+
+def ndjson_lines(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def write_parquet(records: Iterable[Dict[str, Any]], path: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+    """Writes records as Parquet one row group per chunk; requires the optional pyarrow package."""
+    if pyarrow is None:
+        raise RuntimeError("Parquet export requires the pyarrow package")
+    schema = pyarrow.schema([
+        ('user_id', pyarrow.int64()), ('username', pyarrow.string()), ('conversation_id', pyarrow.int64()),
+        ('conversation_title', pyarrow.string()), ('topic', pyarrow.string()), ('message_id', pyarrow.int64()),
+        ('sender', pyarrow.string()), ('content', pyarrow.string()), ('emotion', pyarrow.string()),
+        ('timestamp', pyarrow.timestamp('us')), ('archived', pyarrow.bool_()),
+    ])
+    written = 0
+    with pyarrow.parquet.ParquetWriter(path, schema, compression='zstd') as writer:
+        chunk: List[Dict[str, Any]] = []
+        for record in records:
+            timestamp = record['timestamp']
+            chunk.append(dict(record, timestamp=datetime.fromisoformat(timestamp) if timestamp else None))
+            if len(chunk) >= chunk_size:
+                writer.write_table(pyarrow.Table.from_pylist(chunk, schema=schema))
+                written += len(chunk)
+                chunk = []
+        if chunk:
+            writer.write_table(pyarrow.Table.from_pylist(chunk, schema=schema))
+            written += len(chunk)
+    return written
+
+
+def write_parquet_tempfile(records: Iterable[Dict[str, Any]]) -> str:
+    """Parquet needs a seekable file, so HTTP exports are written to a temp file first; the caller removes it."""
+    fd, path = tempfile.mkstemp(suffix='.parquet')
+    os.close(fd)
+    try:
+        write_parquet(records, path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+# --- ARCHIVAL ---
+def archive_conversation(conversation: Conversation) -> int:
+    """Moves a conversation's messages into a gzip JSON file and records it; returns messages moved."""
+    messages = Message.query.filter_by(conversation_id=conversation.id).order_by(Message.id).all()
+    if not messages:
+        return 0
+    existing = ConversationArchive.query.filter_by(conversation_id=conversation.id).first()
+    # New messages added after an earlier archival are merged into a fresh file
+    payload = _read_archive(existing.path)['messages'] if existing else []
+    payload += [{
+        'id': m.id, 'sender': m.sender, 'content': m.content, 'emotion_detected': m.emotion_detected,
+        'timestamp': m.timestamp.isoformat() if m.timestamp else None,
+    } for m in messages]
+
+    relative_path = os.path.join(str(conversation.user_id), f'{conversation.id}-{int(time.time() * 1000)}.json.gz')
+    full_path = os.path.join(archive_dir(), relative_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with gzip.open(full_path + '.tmp', 'wt', encoding='utf-8') as f:
+        json.dump({'conversation_id': conversation.id, 'user_id': conversation.user_id, 'messages': payload}, f)
+    os.replace(full_path + '.tmp', full_path)
+
+    old_path = existing.path if existing else None
+    try:
+        Message.query.filter(Message.id.in_([m.id for m in messages])).delete(synchronize_session=False)
+        if existing:
+            existing.path = relative_path
+            existing.message_count = len(payload)
+            existing.archived_at = datetime.utcnow()
+        else:
+            db.session.add(ConversationArchive(conversation_id=conversation.id, path=relative_path,
+                                               message_count=len(payload)))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        _remove_archive_file(relative_path)
+        raise
+
+    if old_path:
+        _remove_archive_file(old_path)
+    ARCHIVE_EVENTS.inc(event='archived')
+    return len(messages)
+
+
+def archive_conversations(older_than_days: int = DEFAULT_ARCHIVE_AFTER_DAYS, batch_size: int = 100) -> int:
+    """Archives every conversation whose newest message is older than the cutoff; returns how many."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    archived, failed = 0, set()
+    while True:
+        # Joined to conversation so messages orphaned from their conversation are never picked up
+        stale = (select(Message.conversation_id)
+                 .join(Conversation, Conversation.id == Message.conversation_id)
+                 .group_by(Message.conversation_id)
+                 .having(func.max(Message.timestamp) < cutoff)
+                 .limit(batch_size + len(failed)))
+        conversation_ids = [cid for cid in db.session.execute(stale).scalars() if cid not in failed]
+        if not conversation_ids:
+            return archived
+        conversations = Conversation.query.filter(Conversation.id.in_(conversation_ids)).all()
+        # Deleted since the query above; skip rather than pick them up again forever
+        failed.update(set(conversation_ids) - {c.id for c in conversations})
+        for conversation in conversations:
+            try:
+                archive_conversation(conversation)
+                archived += 1
+            except Exception as e:
+                print(f"Archiving conversation {conversation.id} failed: {e}")
+                failed.add(conversation.id)
+
+
+def rehydrate_conversation(conversation_id: int) -> int:
+    """Restores an archived conversation's messages into the hot table."""
+    archive = ConversationArchive.query.filter_by(conversation_id=conversation_id).first()
+    if not archive:
+        return 0
+    try:
+        messages = _read_archive(archive.path)['messages']
+    except (OSError, ValueError) as e:
+        print(f"Archive for conversation {conversation_id} unreadable: {e}")
+        return 0
+
+    # Claim the archive first: the row lock makes a concurrent restore wait and then find nothing
+    path = archive.path
+    claimed = ConversationArchive.query.filter_by(id=archive.id).delete(synchronize_session=False)
+    if not claimed:
+        db.session.rollback()
+        return 0
+    # Messages get fresh ids: SQLite hands out a deleted max rowid again, so the original
+    # ids may already belong to newer messages. The archive file keeps the originals.
+    if messages:
+        db.session.execute(insert(Message), [{
+            'conversation_id': conversation_id, 'sender': m['sender'], 'content': m['content'],
+            'emotion_detected': m['emotion_detected'],
+            'timestamp': datetime.fromisoformat(m['timestamp']) if m['timestamp'] else None,
+        } for m in messages])
+    db.session.commit()
+    _remove_archive_file(path)
+    ARCHIVE_EVENTS.inc(event='rehydrated')
+    return len(messages)
+
+
+# --- CLI ---
+def init_archive_cli(app) -> None:
+    """Registers `flask export` and `flask archive`."""
+
+    @app.cli.command('export')
+    @click.option('--user', '-u', 'user_ids', type=int, multiple=True, help="User id to export; repeat for a cohort (default: everyone).")
+    @click.option('--since', type=click.DateTime(), help="Only messages at or after this UTC time.")
+    @click.option('--until', type=click.DateTime(), help="Only messages before this UTC time.")
+    @click.option('--format', 'fmt', type=click.Choice(['ndjson', 'parquet']), default='ndjson')
+    @click.option('--output', '-o', default='-', help="Output file ('-' writes NDJSON to stdout).")
+    def export_command(user_ids, since, until, fmt, output):
+        """Stream conversations, messages and emotions to NDJSON or Parquet."""
+        records = iter_export_records(list(user_ids) or None, since, until)
+        if fmt == 'parquet':
+            if output == '-':
+                raise click.UsageError("Parquet output needs --output FILE")
+            try:
+                count = write_parquet(records, output)
+            except RuntimeError as e:
+                raise click.ClickException(str(e))
+        elif output == '-':
+            count = 0
+            for line in ndjson_lines(records):
+                sys.stdout.write(line)
+                count += 1
+        else:
+            count = 0
+            with open(output, 'w', encoding='utf-8') as f:
+                for line in ndjson_lines(records):
+                    f.write(line)
+                    count += 1
+        click.echo(f"Exported {count} messages.", err=True)
+
+    @app.cli.command('archive')
+    @click.option('--older-than-days', type=int,
+                  default=lambda: int(os.environ.get('ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS)),
+                  help="Archive conversations with no message newer than this (default: ARCHIVE_AFTER_DAYS or 180).")
+    @click.option('--batch-size', type=int, default=100)
+    def archive_command(older_than_days, batch_size):
+        """Move old conversations' messages to compressed cold storage."""
+        count = archive_conversations(older_than_days, batch_size)
+        click.echo(f"Archived {count} conversations to {archive_dir()}.")
@@ -0,0 +1,123 @@
+import os
+import re
+import json
+import hashlib
+from typing import Dict, Tuple
+
+from flask import Response, render_template, request
+
+# Build step: `python assets.py` extracts the inline <style>/<script> blocks of the pages
+# below into fingerprinted files under static/dist/ and writes the slimmed pages to build/templates/.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
+DIST_DIR = os.path.join(BASE_DIR, 'static', 'dist')
+BUILD_TEMPLATE_DIR = os.path.join(BASE_DIR, 'build', 'templates')
+MANIFEST_PATH = os.path.join(BASE_DIR, 'build', 'manifest.json')
+DIST_URL_PREFIX = '/static/dist/'
+
+# Pages without any per-request template data
+STATIC_PAGES = ['index.html', 'gamification.html']
+
+# Fingerprinted files never change, so browsers may keep them for a year
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Only attribute-less blocks are inline code; <script src=...> and typed blocks are left alone
+INLINE_BLOCK_RE = re.compile(r'<(style|script)>(.*?)</\1>', re.DOTALL | re.IGNORECASE)
+
+
+def fingerprint(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()[:12]
+
+
+def extract_inline_assets(html: str, page_name: str, out_dir: str = DIST_DIR) -> Tuple[str, Dict[str, str]]:
+    """
+    Moves every inline <style>/<script> block into its own fingerprinted file, keeping
+    document order so global functions used by onclick handlers behave exactly as before.
+    Returns the rewritten page and a {logical name: fingerprinted file} map.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.splitext(page_name)[0]
+    assets = {}
+    counters = {'style': 0, 'script': 0}
+
+    def replace(match):
+        tag = match.group(1).lower()
+        body = match.group(2).strip() + '\n'
+        if not body.strip():
+            return match.group(0)
+        ext = 'css' if tag == 'style' else 'js'
+        suffix = f'-{counters[tag]}' if counters[tag] else ''
+        counters[tag] += 1
+        content = body.encode('utf-8')
+        file_name = f'{stem}{suffix}.{fingerprint(content)}.{ext}'
+        with open(os.path.join(out_dir, file_name), 'wb') as f:
+            f.write(content)
+        assets[f'{stem}{suffix}.{ext}'] = file_name
+        if tag == 'style':
+            return f'<link rel="stylesheet" href="{DIST_URL_PREFIX}{file_name}">'
+        return f'<script src="{DIST_URL_PREFIX}{file_name}"></script>'
+
+    return INLINE_BLOCK_RE.sub(replace, html), assets
+
+
+def build(pages=STATIC_PAGES) -> Dict[str, str]:
+    os.makedirs(BUILD_TEMPLATE_DIR, exist_ok=True)
+    manifest = {}
+    for page in pages:
+        with open(os.path.join(TEMPLATE_DIR, page), encoding='utf-8') as f:
+            html = f.read()
+        slim_html, assets = extract_inline_assets(html, page)
+        with open(os.path.join(BUILD_TEMPLATE_DIR, page), 'w', encoding='utf-8') as f:
+            f.write(slim_html)
+        manifest.update(assets)
+        print(f"Built {page}: {len(html) // 1024} KB -> {len(slim_html) // 1024} KB, {len(assets)} asset(s)")
+    with open(MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class StaticPageCache:
+    """
+    Serves pages that have no dynamic data from memory with an ETag, instead of rendering
+    them through Jinja on every request. Uses the built page when `python assets.py` has
+    been run, otherwise the source template rendered once.
+    """
+
+    def __init__(self, build_dir: str = BUILD_TEMPLATE_DIR):
+        self.build_dir = build_dir
+        self._pages: Dict[str, Tuple[bytes, str]] = {}
+
+    def _load(self, name: str) -> Tuple[bytes, str]:
+        built_path = os.path.join(self.build_dir, name)
+        if os.path.exists(built_path):
+            with open(built_path, 'rb') as f:
+                body = f.read()
+        else:
+            body = render_template(name).encode('utf-8')
+        return body, fingerprint(body)
+
+    def response(self, name: str) -> Response:
+        page = self._pages.get(name)
+        if page is None:
+            page = self._pages[name] = self._load(name)
+        body, etag = page
+        response = Response(body, mimetype='text/html')
+        response.set_etag(etag)
+        # The page itself must be revalidated so new asset fingerprints are picked up
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+
+    def clear(self) -> None:
+        self._pages.clear()
+
+
+def init_static_assets(app) -> None:
+    @app.after_request
+    def _long_cache_fingerprinted(response):
+        if request.path.startswith(DIST_URL_PREFIX) and response.status_code in (200, 304):
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+if __name__ == '__main__':
+    build()
@@ -0,0 +1,93 @@
+import gzip
+import threading
+from typing import Dict, Optional, Tuple
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are not worth the CPU (and may grow when compressed)
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json',
+}
+
+
+def choose_encoding(accept_encoding) -> Optional[str]:
+    if brotli is not None and accept_encoding['br']:
+        return 'br'
+    if accept_encoding['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+class _ImmutableCache:
+    """Compressed bodies of fingerprinted static files; their content never changes for a given path."""
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], bytes] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, path: str, encoding: str, data: bytes) -> bytes:
+        key = (path, encoding)
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached is None:
+            cached = compress(data, encoding)
+            with self._lock:
+                self._entries[key] = cached
+        return cached
+
+
+def init_compression(app, min_size: int = MIN_COMPRESS_SIZE, immutable_prefix: str = '/static/dist/') -> None:
+    """gzip/brotli-compresses HTML, JSON, CSS and JS responses above min_size."""
+    immutable_cache = _ImmutableCache()
+
+    @app.after_request
+    def _compress_response(response):
+        if (response.status_code != 200
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or 'Content-Encoding' in response.headers
+                or response.is_streamed and not response.direct_passthrough):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        immutable = request.path.startswith(immutable_prefix)
+        if response.direct_passthrough:
+            # send_file() responses; only the bounded, fingerprinted bundles are buffered
+            if not immutable:
+                return response
+            response.direct_passthrough = False
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        if immutable:
+            body = immutable_cache.get_or_compress(request.path, encoding, data)
+        else:
+            body = compress(data, encoding)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        # The representation changed, so a strong validator would no longer be accurate
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -89,3 +89,15 @@ class Message(db.Model):
 
     def __repr__(self):
         return f'<Message {self.sender}: {self.content[:30]}>'
+
+# Conversations whose messages were moved to cold storage (see archive.py).
+# The Conversation row stays in place; its messages live in a compressed file until rehydrated.
+class ConversationArchive(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), unique=True, nullable=False)
+    path = db.Column(db.String(255), nullable=False)  # relative to ARCHIVE_DIR
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ConversationArchive {self.conversation_id}: {self.message_count} messages>'
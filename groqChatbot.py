@@ -1,13 +1,15 @@
 import os
 import json
-from typing import Dict, Any, List, Optional
+import time
+from typing import Dict, Any, List, Optional, Callable
 from dotenv import load_dotenv
 from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.messages import SystemMessage
-from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_groq import ChatGroq
+from metrics import LLM_LATENCY, LLM_TIME_TO_FIRST_TOKEN, LLM_TOKENS, LLM_ERRORS
+from llm_client import ResilientLLMClient, LLMError, AttemptAbandoned
 
 load_dotenv() 
 
@@ -15,8 +17,23 @@ MAX_HISTORY_MESSAGES = 10
 
 class LLM_Chatbot:
     def __init__(self):
-        self.llm = ChatGroq(model=os.environ.get("GROQ_MODEL", "llama-3.3-70b-versatile"), temperature=0.7)
-        self.chain = self._build_chain()
+        self.model_name = os.environ.get("GROQ_MODEL", "llama-3.3-70b-versatile")
+        # Models tried in order when the primary times out, fails or has its circuit open
+        fallback_models = [m.strip() for m in os.environ.get("GROQ_FALLBACK_MODELS", "llama-3.1-8b-instant").split(",") if m.strip()]
+        self.client = ResilientLLMClient(
+            [self.model_name] + [m for m in fallback_models if m != self.model_name],
+            self._create_llm,
+            deadline=float(os.environ.get("LLM_DEADLINE", 45)),
+            attempt_timeout=float(os.environ.get("LLM_TIMEOUT", 20)),
+            max_retries=int(os.environ.get("LLM_MAX_RETRIES", 2)),
+            hedge=os.environ.get("LLM_HEDGE", "1") == "1",
+            breaker_failures=int(os.environ.get("LLM_BREAKER_FAILURES", 5)),
+            breaker_reset=float(os.environ.get("LLM_BREAKER_RESET", 30)),
+            # Concurrent LLM calls (e.g. a whole classroom asking at once) plus their hedges
+            max_workers=int(os.environ.get("LLM_MAX_CONCURRENCY", 64)),
+        )
+        self.llm = self.client.primary.llm
+        self.prompt = self._build_prompt()
         self.history_store: Dict[str, ChatMessageHistory] = {}
         
         if not os.environ.get("GROQ_API_KEY"):
@@ -24,7 +41,7 @@ class LLM_Chatbot:
 
     def _generate_system_prompt(self, user_data: Dict[str, Any]) -> str:
 
-        facial_emotion = user_data.get('facial_emotion', 'Neutral')
+        facial_emotion = user_data.get('facial_emotion') or 'Neutral'
         context = user_data.get('context', 'a student')
         likes = user_data.get('likes', 'learning')
         session_topic = user_data.get('session_topic', 'general learning')
@@ -72,53 +89,115 @@ class LLM_Chatbot:
         )
         return system_prompt
 
-    def _build_chain(self):
-        prompt = ChatPromptTemplate.from_messages(
+    def _create_llm(self, model_name: str) -> ChatGroq:
+        # Retries are handled by ResilientLLMClient, so the SDK's own retry loop is disabled
+        return ChatGroq(model=model_name, temperature=0.7,
+                        timeout=float(os.environ.get("LLM_TIMEOUT", 20)), max_retries=0)
+
+    def _build_prompt(self) -> ChatPromptTemplate:
+        return ChatPromptTemplate.from_messages(
             [
                 MessagesPlaceholder(variable_name="system_message"), 
                 MessagesPlaceholder(variable_name="history"),
                 ("human", "{input}"),
             ]
         )
-        return prompt | self.llm | StrOutputParser()
+
+    def _run_chain(self, chain, chain_input: Dict[str, Any], operation: str,
+                   on_chunk: Optional[Callable[[str], None]] = None, model_name: Optional[str] = None) -> str:
+        """Streams the chain and records latency, time-to-first-token, token usage and errors."""
+        # No output parser on the chains: the raw message chunks carry the provider's token usage
+        labels = {'operation': operation, 'model': model_name or self.model_name}
+        start = time.perf_counter()
+        message = None
+        first_token = True
+        try:
+            for chunk in chain.stream(chain_input, config={}):
+                message = chunk if message is None else message + chunk
+                if chunk.content:
+                    if first_token:
+                        LLM_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start, **labels)
+                        first_token = False
+                    if on_chunk:
+                        on_chunk(chunk.content)
+        except AttemptAbandoned:
+            raise  # the client gave up on this attempt; not a provider error
+        except Exception as e:
+            LLM_ERRORS.inc(error=type(e).__name__, **labels)
+            raise
+        finally:
+            LLM_LATENCY.observe(time.perf_counter() - start, **labels)
+
+        if message is None:
+            return ""
+        usage = getattr(message, 'usage_metadata', None) or {}
+        for kind in ('input', 'output'):
+            if usage.get(f'{kind}_tokens'):
+                LLM_TOKENS.inc(usage[f'{kind}_tokens'], kind=kind, **labels)
+        return message.content
     
     def _get_session_history(self, session_id: str) -> ChatMessageHistory:
         if session_id not in self.history_store:
             self.history_store[session_id] = ChatMessageHistory()
         return self.history_store[session_id]
 
-    def get_response(self, conversation_id: int, user_message: str, user_data: Dict[str, Any]) -> str:
+    def get_response(self, conversation_id: int, user_message: str, user_data: Dict[str, Any],
+                     on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Returns the full VTA reply. The reply is streamed; when on_chunk is given every
+        text delta is passed to it as soon as it arrives (used for incremental TTS).
+        Raises an LLMError subclass when no model could answer.
+        """
         session_id = str(conversation_id)
         system_text = self._generate_system_prompt(user_data)
         system_message_lc = SystemMessage(content=system_text)
         history = self._get_session_history(session_id)
-        history.add_user_message(user_message)
+
+        chain_input = {
+            "input": user_message,
+            "system_message": [system_message_lc],
+            "history": list(history.messages)
+        }
 
         try:
-            result = self.chain.invoke(
-                {
-                    "input": user_message,
-                    "system_message": [system_message_lc],
-                    "history": history.messages[:-1]    
-                },
-                config={}
+            ai_text = self.client.call(
+                lambda llm, model_name, chunk_cb: self._run_chain(self.prompt | llm, chain_input, 'chat', chunk_cb, model_name),
+                on_chunk=on_chunk
             )
-            ai_text = result
-        except Exception as e:
-            print(f"Groq/LangChain API Error: {e}")
-            ai_text = f"I apologize, {user_data.get('username', 'Learner')}, I'm currently unable to access my knowledge base."
+        except LLMError as e:
+            print(f"Groq/LangChain API Error ({e.code}): {e}")
+            raise
 
+        # Only completed exchanges enter the history
+        history.add_user_message(user_message)
         history.add_ai_message(ai_text)
         self._trim_history_buffer(history)
         
         return ai_text
 
+    def remember_exchange(self, conversation_id: int, user_message: str, ai_text: str) -> None:
+        """Keeps the session history consistent when a reply was served without calling the LLM."""
+        history = self._get_session_history(str(conversation_id))
+        history.add_user_message(user_message)
+        history.add_ai_message(ai_text)
+        self._trim_history_buffer(history)
+
+    def last_reply(self, conversation_id: int) -> Optional[str]:
+        """The previous VTA turn the LLM will see for this conversation, or None on a fresh history."""
+        for message in reversed(self._get_session_history(str(conversation_id)).messages):
+            if message.type == 'ai':
+                return message.content
+        return None
+
     def _trim_history_buffer(self, history: ChatMessageHistory, max_messages: int = MAX_HISTORY_MESSAGES) -> None:
         if len(history.messages) > max_messages:
             history.messages = history.messages[-max_messages:]
 
     def generate_quiz(self, chat_context: str, difficulty: str = "Medium", num_questions: int = 5) -> Optional[Dict[str, Any]]:
-        """Generates a quiz based on the conversation context with customizable length."""
+        """
+        Generates a quiz based on the conversation context with customizable length.
+        Returns None when the reply is not a valid quiz; raises LLMError when no model could answer.
+        """
         
         system_prompt = (
             f"You are an expert quiz generator. Your task is to create a {difficulty} level quiz based on the provided conversation context. "
@@ -142,17 +221,18 @@ class LLM_Chatbot:
         
         print(f"DEBUG: asking LLM for {num_questions} questions...")
 
+        # Create a temporary prompt for this specific task
+        # We use {context} as a variable to be safe from braces in user messages
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", system_prompt),
+            ("human", "Context:\n{context}")
+        ])
+
+        result = self.client.call(
+            lambda llm, model_name, chunk_cb: self._run_chain(prompt | llm, {"context": chat_context}, 'quiz', chunk_cb, model_name)
+        )
+
         try:
-            # Create a temporary chain for this specific task
-            # We use {context} as a variable to be safe from braces in user messages
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", system_prompt),
-                ("human", "Context:\n{context}")
-            ])
-            
-            chain = prompt | self.llm | StrOutputParser()
-            result = chain.invoke({"context": chat_context})
-            
             # Clean up potential markdown formatting if the model disregards instructions
             cleaned_result = result.replace("```json", "").replace("```", "").strip()
             
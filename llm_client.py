@@ -0,0 +1,309 @@
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, List, Optional
+
+from metrics import registry
+
+LLM_OUTCOMES = registry.counter('vta_llm_outcomes_total', 'Resilient client outcomes per model.', ('model', 'outcome'))
+LLM_CIRCUIT_OPEN = registry.gauge('vta_llm_circuit_open', '1 while the circuit breaker of a model is open.', ('model',))
+
+
+# --- STRUCTURED ERRORS ---
+class LLMError(Exception):
+    """Base class for every failure the resilient client reports instead of a sentinel string."""
+    code = 'llm_error'
+
+    def __init__(self, message: str, model: Optional[str] = None, cause: Optional[BaseException] = None):
+        super().__init__(message)
+        self.model = model
+        self.cause = cause
+
+
+class LLMTimeoutError(LLMError):
+    code = 'timeout'
+
+
+class LLMUnavailableError(LLMError):
+    """Every model's circuit breaker is open; the call failed fast without touching the provider."""
+    code = 'circuit_open'
+
+
+class LLMProviderError(LLMError):
+    code = 'provider_error'
+
+
+class LLMOverloadedError(LLMError):
+    """No worker thread picked the attempt up before the deadline; the provider was never asked."""
+    code = 'overloaded'
+
+
+class AttemptAbandoned(Exception):
+    """Raised into a streaming attempt the client has given up on, so it stops and frees its worker."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    # 4xx other than 408/409/429 (bad request, auth, not found) will fail the same way again
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    if isinstance(status, int) and 400 <= status < 500:
+        return status in (408, 409, 429)
+    return True
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and fails fast for `reset_timeout` seconds,
+    then lets a single trial call through (half-open) to decide whether to close again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def release_trial(self) -> None:
+        """Gives back a half-open trial that ended without reaching the provider."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies, used to pick the hedging delay."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _Model:
+    def __init__(self, name: str, llm: Any, breaker: CircuitBreaker):
+        self.name = name
+        self.llm = llm
+        self.breaker = breaker
+        self.latency = LatencyTracker()
+
+
+class _Running:
+    """A submitted attempt; its timeout starts when a worker begins it, not when it is queued."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.started_at: Optional[float] = None
+        self.future = None
+
+
+class ResilientLLMClient:
+    """
+    Runs an LLM call against a chain of models with a per-call deadline, jittered retries,
+    an optional hedged second request once the model's p95 latency has passed, and a circuit
+    breaker per model. Raises an LLMError subclass when every option is exhausted.
+
+    Attempts run on a shared worker pool; size max_workers for the expected number of
+    concurrent calls (plus hedges). Time spent waiting for a worker never counts as a
+    provider timeout or a breaker failure.
+    """
+
+    def __init__(self, model_names: List[str], llm_factory: Callable[[str], Any], deadline: float = 45.0,
+                 attempt_timeout: float = 20.0, max_retries: int = 2, backoff: float = 0.5, hedge: bool = True,
+                 hedge_quantile: float = 0.95, breaker_failures: int = 5, breaker_reset: float = 30.0, max_workers: int = 64):
+        self.models = [_Model(name, llm_factory(name), CircuitBreaker(breaker_failures, breaker_reset))
+                       for name in model_names]
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-call')
+
+    @property
+    def primary(self) -> _Model:
+        return self.models[0]
+
+    def call(self, attempt: Callable[..., str], on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        """
+        attempt(llm, model_name, on_chunk) performs one provider call and returns the text.
+        Streaming calls (on_chunk given) are never hedged, and are not retried once text has
+        been emitted, because the caller has already consumed it.
+        """
+        deadline = time.monotonic() + self.deadline
+        stream = _StreamGuard(on_chunk) if on_chunk else None
+        last_error: Optional[LLMError] = None
+
+        for model in self.models:
+            # Checked before allow(): a half-open trial must not be granted to a call that cannot use it
+            if deadline - time.monotonic() <= 0:
+                raise LLMTimeoutError('LLM call deadline exceeded', model=model.name, cause=last_error)
+            if not model.breaker.allow():
+                LLM_OUTCOMES.inc(model=model.name, outcome='circuit_open')
+                continue
+            for attempt_number in range(self.max_retries + 1):
+                if deadline - time.monotonic() <= 0:
+                    model.breaker.release_trial()
+                    raise LLMTimeoutError('LLM call deadline exceeded', model=model.name, cause=last_error)
+                try:
+                    result = self._attempt(model, attempt, stream, deadline)
+                    LLM_OUTCOMES.inc(model=model.name, outcome='success' if model is self.primary else 'fallback')
+                    return result
+                except LLMOverloadedError as e:
+                    model.breaker.release_trial()
+                    LLM_OUTCOMES.inc(model=model.name, outcome=e.code)
+                    raise
+                except LLMError as e:
+                    last_error = e
+                    LLM_OUTCOMES.inc(model=model.name, outcome=e.code)
+                except BaseException:
+                    model.breaker.release_trial()
+                    raise
+                finally:
+                    LLM_CIRCUIT_OPEN.set(1 if model.breaker.is_open else 0, model=model.name)
+
+                if stream is not None and stream.emitted:
+                    raise last_error
+                if not is_retryable(last_error.cause):
+                    # The request itself is at fault; another model would reject it the same way
+                    raise last_error
+                if not model.breaker.allow():
+                    break
+                # Full jitter keeps a burst of clients from retrying in lockstep
+                delay = random.uniform(0, self.backoff * (2 ** attempt_number))
+                time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+
+        if last_error is None:
+            raise LLMUnavailableError('All LLM circuit breakers are open')
+        raise last_error
+
+    def _submit(self, model: _Model, attempt: Callable[..., str], on_chunk) -> _Running:
+        running = _Running()
+
+        def run():
+            running.started_at = time.monotonic()
+            running.started.set()
+            return attempt(model.llm, model.name, on_chunk)
+        running.future = self._executor.submit(run)
+        return running
+
+    def _attempt(self, model: _Model, attempt: Callable[..., str], stream: Optional['_StreamGuard'],
+                 deadline: float) -> str:
+        on_chunk = stream.begin_attempt() if stream else None
+        primary = self._submit(model, attempt, on_chunk)
+
+        # Queueing behind other calls is our own saturation, not the provider's: it neither
+        # uses up the attempt timeout nor counts against the breaker
+        if not primary.started.wait(max(0.0, deadline - time.monotonic())) and primary.future.cancel():
+            if stream:
+                stream.cancel_attempt()
+            raise LLMOverloadedError(f'No LLM worker free for {model.name} before the deadline', model=model.name)
+        primary.started.wait()
+        attempt_end = min(primary.started_at + self.attempt_timeout, deadline)
+        running = [primary]
+
+        hedge_delay = model.latency.percentile(self.hedge_quantile) if self.hedge and stream is None else None
+        if hedge_delay is not None and primary.started_at + hedge_delay < attempt_end:
+            done, _ = wait([primary.future], timeout=max(0.0, primary.started_at + hedge_delay - time.monotonic()))
+            if not done:
+                LLM_OUTCOMES.inc(model=model.name, outcome='hedged')
+                running.append(self._submit(model, attempt, None))
+
+        error = None
+        pending = {r.future for r in running}
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, attempt_end - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    winner = next(r for r in running if r.future is future)
+                    model.breaker.record_success()
+                    model.latency.add(time.monotonic() - winner.started_at)
+                    if winner is not primary:
+                        LLM_OUTCOMES.inc(model=model.name, outcome='hedge_won')
+                    for other in running:
+                        other.future.cancel()  # a hedge still waiting for a worker is dropped
+                    return future.result()
+                error = future.exception()
+
+        # Abandoned streams stop at their next chunk; queued hedges are dropped. A non-streaming
+        # call already in flight runs until the SDK's own timeout (set to the attempt timeout).
+        if stream:
+            stream.cancel_attempt()
+        for r in running:
+            r.future.cancel()
+        if error is None and attempt_end < primary.started_at + self.attempt_timeout:
+            # Cut short by the caller's deadline, not by the model's own timeout
+            model.breaker.release_trial()
+            raise LLMTimeoutError('LLM call deadline exceeded', model=model.name)
+        if error is not None and not is_retryable(error):
+            # A rejected request (400/401/404) says nothing about the model's health
+            model.breaker.release_trial()
+            raise LLMProviderError(f'{model.name} rejected the request: {error}', model=model.name, cause=error)
+        model.breaker.record_failure()
+        if error is None:
+            raise LLMTimeoutError(f'{model.name} did not answer within {self.attempt_timeout:.1f}s', model=model.name)
+        raise LLMProviderError(f'{model.name} failed: {error}', model=model.name, cause=error)
+
+
+class _StreamGuard:
+    """Forwards deltas of the current attempt only; an abandoned attempt is stopped instead of leaking text."""
+
+    def __init__(self, on_chunk: Callable[[str], None]):
+        self._on_chunk = on_chunk
+        self._attempt = 0
+        self.emitted = False
+
+    def begin_attempt(self) -> Callable[[str], None]:
+        self._attempt += 1
+        attempt_id = self._attempt
+
+        def forward(delta: str) -> None:
+            if attempt_id != self._attempt:
+                raise AttemptAbandoned()
+            self.emitted = True
+            self._on_chunk(delta)
+        return forward
+
+    def cancel_attempt(self) -> None:
+        self._attempt += 1
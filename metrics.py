@@ -0,0 +1,326 @@
+import os
+import sys
+import time
+import threading
+from bisect import bisect_left
+from collections import Counter as _StackCounter
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+from flask import Response, g, has_request_context, jsonify, request
+
+# Default latency buckets in seconds (Prometheus client defaults)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return '\n'.join(lines)
+
+    def _render_sample(self, key, value):
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}']
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type_name = 'gauge'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_sample(self, key, state):
+        counts, total, count = state[0], state[1], state[2]
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(float(bound))}"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}')
+        label_text = _format_labels(self.label_names, key)
+        lines.append(f'{self.name}_sum{label_text} {_format_value(total)}')
+        lines.append(f'{self.name}_count{label_text} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labels=()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+# Global registry shared by app.py, groqChatbot.py and video_analysis
+registry = Registry()
+
+# --- HTTP ---
+HTTP_REQUEST_LATENCY = registry.histogram('vta_http_request_duration_seconds', 'Flask request latency.', ('route', 'method', 'status'))
+HTTP_IN_FLIGHT = registry.gauge('vta_http_requests_in_flight', 'Requests currently being handled.', ('route',))
+DB_QUERIES_PER_REQUEST = registry.histogram('vta_db_queries_per_request', 'SQL statements executed per request.', ('route',), COUNT_BUCKETS)
+DB_QUERIES = registry.counter('vta_db_queries_total', 'SQL statements executed.', ('route',))
+
+# --- Video ---
+VIDEO_STAGE_LATENCY = registry.histogram('vta_video_stage_duration_seconds', 'Time spent in each analyze_video_frame stage.', ('stage',))
+VIDEO_FRAMES_RECEIVED = registry.counter('vta_video_frames_received_total', 'Frames received over SocketIO.')
+VIDEO_FRAMES_PROCESSED = registry.counter('vta_video_frames_processed_total', 'Frames that produced an emotion label.')
+VIDEO_FRAMES_DROPPED = registry.counter('vta_video_frames_dropped_total', 'Frames that could not be analyzed.', ('reason',))
+VIDEO_FRAME_LATENCY = registry.histogram('vta_video_frame_duration_seconds', 'End-to-end video_stream handler latency.')
+
+# --- LLM ---
+LLM_LATENCY = registry.histogram('vta_llm_request_duration_seconds', 'LLM call latency.', ('operation', 'model'))
+LLM_TIME_TO_FIRST_TOKEN = registry.histogram('vta_llm_time_to_first_token_seconds', 'Time until the first streamed token.', ('operation', 'model'))
+LLM_TOKENS = registry.counter('vta_llm_tokens_total', 'Tokens reported by the provider.', ('operation', 'model', 'kind'))
+LLM_ERRORS = registry.counter('vta_llm_errors_total', 'Failed LLM calls.', ('operation', 'model', 'error'))
+
+
+# --- SAMPLING PROFILER ---
+class SamplingProfiler:
+    """
+    Low-overhead wall-clock profiler: a background thread samples every thread's stack
+    at a fixed interval and aggregates them into collapsed stacks (flamegraph.pl format).
+    """
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._stacks = _StackCounter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.samples = 0
+        self.started_at = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: Optional[float] = None) -> None:
+        if self.running:
+            return
+        if interval:
+            self.interval = interval
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='vta-sampling-profiler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def collapsed(self, limit: int = 500) -> str:
+        with self._lock:
+            top = self._stacks.most_common(limit)
+        return '\n'.join(f'{stack} {count}' for stack, count in top) + '\n'
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == own_ident:
+                        continue
+                    names = []
+                    while frame is not None and len(names) < self.max_depth:
+                        code = frame.f_code
+                        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                        frame = frame.f_back
+                    self._stacks[';'.join(reversed(names))] += 1
+                self.samples += 1
+
+
+profiler = SamplingProfiler()
+
+# Bounds for the runtime profiler switch: below 1 ms the sampler becomes a busy loop
+PROFILER_MIN_INTERVAL = 0.001
+PROFILER_MAX_INTERVAL = 1.0
+PROFILER_MAX_LIMIT = 5000
+
+
+# --- FLASK / SQLALCHEMY WIRING ---
+def _route_label() -> str:
+    # Use the URL rule, not the raw path, to keep label cardinality bounded
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def count_db_query(*args, **kwargs) -> None:
+    if has_request_context() and 'db_queries' in g:
+        g.db_queries += 1
+
+
+def _check_token(required: bool = False) -> bool:
+    token = os.environ.get('METRICS_TOKEN')
+    if not token:
+        return not required
+    return request.headers.get('Authorization') == f'Bearer {token}'
+
+
+def _bounded(value, cast, default, low, high):
+    if value is None:
+        return default
+    try:
+        value = cast(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    # NaN compares false against both bounds and would slip through the clamp
+    return min(max(value, low), high) if value == value else None
+
+
+def init_metrics(app, engine_class=None) -> None:
+    """Registers request timing hooks, the /metrics endpoint and the runtime profiler switch."""
+
+    @app.before_request
+    def _start_request_metrics():
+        g.request_started = time.perf_counter()
+        g.db_queries = 0
+        g.metrics_route = _route_label()
+        HTTP_IN_FLIGHT.inc(route=g.metrics_route)
+
+    @app.after_request
+    def _record_request_metrics(response):
+        if 'request_started' in g:
+            HTTP_REQUEST_LATENCY.observe(time.perf_counter() - g.request_started,
+                                         route=g.metrics_route, method=request.method, status=response.status_code)
+            DB_QUERIES_PER_REQUEST.observe(g.db_queries, route=g.metrics_route)
+            DB_QUERIES.inc(g.db_queries, route=g.metrics_route)
+        return response
+
+    @app.teardown_request
+    def _finish_request_metrics(exc):
+        if 'metrics_route' in g:
+            HTTP_IN_FLIGHT.dec(route=g.metrics_route)
+
+    if engine_class is not None:
+        from sqlalchemy import event
+        event.listen(engine_class, 'before_cursor_execute', count_db_query)
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        if not _check_token():
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/metrics/profiler', methods=['GET', 'POST'])
+    def metrics_profiler():
+        # POST {"enabled": true, "interval": 0.005} to start, {"enabled": false} to stop;
+        # GET returns the collapsed stacks collected so far.
+        # The profiler exposes every thread's stack, so it is only available with METRICS_TOKEN set.
+        if not _check_token(required=True):
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            if data.get('enabled'):
+                interval = _bounded(data.get('interval'), float, profiler.interval,
+                                    PROFILER_MIN_INTERVAL, PROFILER_MAX_INTERVAL)
+                if interval is None:
+                    return jsonify({'success': False, 'message': 'interval must be a number of seconds'}), 400
+                profiler.start(interval)
+            else:
+                profiler.stop()
+            return jsonify({'success': True, 'running': profiler.running, 'samples': profiler.samples})
+        limit = _bounded(request.args.get('limit'), int, 500, 1, PROFILER_MAX_LIMIT)
+        if limit is None:
+            return jsonify({'success': False, 'message': 'limit must be an integer'}), 400
+        return Response(profiler.collapsed(limit), mimetype='text/plain')
@@ -0,0 +1,75 @@
+import os
+import json
+import queue
+import threading
+from typing import Any, Dict
+
+import socketio
+
+DEFAULT_CHANNEL = 'flask-socketio'
+
+
+class LocalQueueManager(socketio.PubSubManager):
+    """
+    In-process stand-in for a Redis/RabbitMQ/Kafka message queue.
+    Every manager subscribed to the same channel in this process receives every published
+    message, so two SocketIO servers ("workers") can be wired together in a single test run.
+    """
+    name = 'local'
+
+    _channels: Dict[str, list] = {}
+    _channels_lock = threading.Lock()
+
+    def __init__(self, url: str = 'local://', channel: str = DEFAULT_CHANNEL, write_only: bool = False,
+                 logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self._inbox = queue.Queue()
+        if not write_only:
+            with self._channels_lock:
+                self._channels.setdefault(channel, []).append(self._inbox)
+
+    def _publish(self, data):
+        # Serialize like a real broker would, so nothing process-local leaks between workers
+        payload = json.dumps(data)
+        with self._channels_lock:
+            subscribers = list(self._channels.get(self.channel, []))
+        for inbox in subscribers:
+            inbox.put(payload)
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+
+def socketio_options() -> Dict[str, Any]:
+    """
+    SocketIO() keyword arguments for the configured deployment mode.
+
+    SOCKETIO_ASYNC_MODE      threading (default, single process), eventlet or gevent
+    SOCKETIO_MESSAGE_QUEUE   redis://..., amqp://..., kafka://..., zmq+tcp://... or local://
+    SOCKETIO_CHANNEL         channel name shared by all workers of one deployment
+    """
+    options = {'async_mode': os.environ.get('SOCKETIO_ASYNC_MODE', 'threading')}
+    url = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    if url:
+        channel = os.environ.get('SOCKETIO_CHANNEL', DEFAULT_CHANNEL)
+        if url.startswith('local://'):
+            options['client_manager'] = LocalQueueManager(url, channel=channel)
+        else:
+            options['message_queue'] = url
+            options['channel'] = channel
+    return options
+
+
+def is_multi_worker() -> bool:
+    return bool(os.environ.get('SOCKETIO_MESSAGE_QUEUE'))
+
+
+def user_room(user_id: int) -> str:
+    # Every socket of a logged-in user joins this room, whichever worker it is connected to
+    return f'user:{user_id}'
+
+
+def push_to_user(socketio_server, user_id: int, event: str, data: Dict[str, Any]) -> None:
+    """Emits to all of a user's connections; with a message queue this reaches every worker."""
+    socketio_server.emit(event, data, to=user_room(user_id))
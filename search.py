@@ -0,0 +1,147 @@
+import re
+from html import escape
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+
+from database import db
+
+FTS_TABLE = 'message_fts'
+MAX_PER_PAGE = 50
+
+# Private-use characters mark highlights inside snippets; the snippet is HTML-escaped first
+# and the markers are then turned into <mark> tags, so message content can never inject HTML.
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_END = '\ue001'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# --- SQLite FTS5 ---
+# A separate FTS5 table keyed by message.id. The `owner` column holds a 'u<user_id>' token so the
+# per-user filter is answered from the full-text index itself instead of by joining every match.
+# Triggers keep it in sync inside the same transaction that writes the message row.
+SQLITE_SETUP = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        content, owner, tokenize = 'unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON message BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, content, owner)
+        SELECT new.id, new.content, 'u' || conversation.user_id FROM conversation WHERE conversation.id = new.conversation_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON message BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF content ON message BEGIN
+        UPDATE {FTS_TABLE} SET content = new.content WHERE rowid = new.id;
+    END""",
+]
+SQLITE_BACKFILL = f"""
+    INSERT INTO {FTS_TABLE}(rowid, content, owner)
+    SELECT message.id, message.content, 'u' || conversation.user_id
+    FROM message JOIN conversation ON conversation.id = message.conversation_id"""
+SQLITE_QUERY = f"""
+    SELECT message.id, message.conversation_id, message.sender, message.timestamp, conversation.title,
+           snippet({FTS_TABLE}, 0, :start, :end, '…', 16) AS snippet,
+           bm25({FTS_TABLE}, 1.0, 0.0) AS rank
+    FROM {FTS_TABLE}
+    JOIN message ON message.id = {FTS_TABLE}.rowid
+    JOIN conversation ON conversation.id = message.conversation_id
+    WHERE {FTS_TABLE} MATCH :match
+    ORDER BY rank
+    LIMIT :limit OFFSET :offset"""
+
+# --- PostgreSQL ---
+# An expression GIN index on message.content is maintained by Postgres in the inserting transaction.
+POSTGRES_SETUP = [
+    "CREATE INDEX IF NOT EXISTS message_content_fts_idx ON message USING GIN (to_tsvector('english', content))",
+    "CREATE INDEX IF NOT EXISTS conversation_user_id_idx ON conversation (user_id)",
+    "CREATE INDEX IF NOT EXISTS message_conversation_id_idx ON message (conversation_id)",
+]
+POSTGRES_QUERY = """
+    SELECT message.id, message.conversation_id, message.sender, message.timestamp, conversation.title,
+           ts_headline('english', message.content, query, :headline) AS snippet,
+           ts_rank(to_tsvector('english', message.content), query) AS rank
+    FROM message
+    JOIN conversation ON conversation.id = message.conversation_id,
+         websearch_to_tsquery('english', :q) AS query
+    WHERE conversation.user_id = :user_id AND to_tsvector('english', message.content) @@ query
+    ORDER BY rank DESC
+    LIMIT :limit OFFSET :offset"""
+
+
+def setup_search_index() -> None:
+    """Creates the full-text index for the current database; backfills it the first time on SQLite."""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        exists = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+        ).first()
+        for statement in SQLITE_SETUP:
+            db.session.execute(text(statement))
+        if not exists:
+            db.session.execute(text(SQLITE_BACKFILL))
+            print("Search index built from existing messages.")
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_SETUP:
+            db.session.execute(text(statement))
+    else:
+        print(f"WARNING: no full-text index for '{dialect}'; search falls back to a LIKE scan.")
+    db.session.commit()
+
+
+def build_fts5_query(user_id: int, query: str) -> str:
+    """Quotes every token (FTS5 syntax never leaks through) and prefix-matches the last one."""
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return ''
+    terms = ' '.join(f'"{token}"' for token in tokens[:-1])
+    terms = f'{terms} "{tokens[-1]}"*'.strip()
+    return f'owner : "u{int(user_id)}" AND content : ({terms})'
+
+
+def _highlight(snippet: str) -> str:
+    return escape(snippet or '').replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+
+
+def search_messages(user_id: int, query: str, page: int = 1, per_page: int = 20) -> Dict[str, Any]:
+    """Ranked, paginated search over one user's messages with highlighted snippets."""
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    page = max(1, page)
+    # One extra row tells whether there is a next page without counting every match
+    params = {'limit': per_page + 1, 'offset': (page - 1) * per_page}
+
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        match = build_fts5_query(user_id, query)
+        if not match:
+            return {'results': [], 'page': page, 'per_page': per_page, 'has_more': False}
+        params.update(match=match, start=HIGHLIGHT_START, end=HIGHLIGHT_END)
+        rows = db.session.execute(text(SQLITE_QUERY), params).all()
+    elif dialect == 'postgresql':
+        params.update(q=query, user_id=user_id,
+                      headline=f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=24, MinWords=8')
+        rows = db.session.execute(text(POSTGRES_QUERY), params).all()
+    else:
+        rows = _like_search(user_id, query, params)
+
+    results: List[Dict[str, Any]] = [{
+        'message_id': row.id,
+        'conversation_id': row.conversation_id,
+        'conversation_title': row.title,
+        'sender': row.sender,
+        'snippet': _highlight(row.snippet),
+        'timestamp': row.timestamp.strftime("%Y-%m-%d %H:%M:%S") if hasattr(row.timestamp, 'strftime') else row.timestamp,
+    } for row in rows[:per_page]]
+
+    return {'results': results, 'page': page, 'per_page': per_page, 'has_more': len(rows) > per_page}
+
+
+def _like_search(user_id: int, query: str, params: Dict[str, Any]):
+    # Unindexed fallback for databases without a full-text backend; newest first, no ranking
+    params.update(user_id=user_id, pattern=f'%{query}%')
+    return db.session.execute(text("""
+        SELECT message.id, message.conversation_id, message.sender, message.timestamp, conversation.title,
+               substr(message.content, 1, 160) AS snippet
+        FROM message JOIN conversation ON conversation.id = message.conversation_id
+        WHERE conversation.user_id = :user_id AND message.content LIKE :pattern
+        ORDER BY message.timestamp DESC
+        LIMIT :limit OFFSET :offset"""), params).all()
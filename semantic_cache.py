@@ -0,0 +1,206 @@
+import os
+import re
+import hashlib
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from metrics import registry
+
+SEMANTIC_CACHE_LOOKUPS = registry.counter('vta_semantic_cache_lookups_total', 'Semantic answer cache lookups.', ('result',))
+SEMANTIC_CACHE_SIMILARITY = registry.histogram('vta_semantic_cache_best_similarity', 'Best cosine similarity found per lookup.',
+                                               buckets=(0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.96, 0.98, 1.0))
+SEMANTIC_CACHE_LATENCY = registry.histogram('vta_semantic_cache_lookup_duration_seconds', 'Embedding + index search time.')
+SEMANTIC_CACHE_ENTRIES = registry.gauge('vta_semantic_cache_entries', 'Cached answers across all topics.')
+
+
+class SentenceTransformerEmbedder:
+    """Small local CPU model (all-MiniLM-L6-v2 by default, ~5 ms per question)."""
+    default_threshold = 0.9
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.name = model_name
+        self.model = SentenceTransformer(model_name, device='cpu')
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+
+def create_embedder(model_name: str) -> Optional[SentenceTransformerEmbedder]:
+    """None when the model cannot load; lexical similarity is too coarse to share answers safely."""
+    try:
+        return SentenceTransformerEmbedder(model_name)
+    except Exception as e:
+        print(f"WARNING: semantic cache disabled, embedding model '{model_name}' unavailable ({e}).")
+        return None
+
+
+class _Entry:
+    __slots__ = ('question', 'answer', 'username', 'conversation_id', 'follows', 'created_at', 'last_used', 'hits')
+
+    def __init__(self, question, answer, username, conversation_id, follows=''):
+        self.question = question
+        self.answer = answer
+        self.follows = follows
+        self.username = username
+        self.conversation_id = conversation_id
+        self.created_at = self.last_used = time.time()
+        self.hits = 0
+
+
+class TopicIndex:
+    """Flat vector index for one topic; a matrix-vector product is exact and fast at this size."""
+
+    def __init__(self, dim: int, max_entries: int):
+        self.max_entries = max_entries
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.entries: List[_Entry] = []
+
+    def search(self, vector: np.ndarray, follows: str = '') -> Tuple[int, float]:
+        """Best match among the entries asked after the same previous answer."""
+        candidates = np.array([e.follows == follows for e in self.entries], dtype=bool)
+        if not candidates.any():
+            return -1, 0.0
+        scores = np.where(candidates, self.vectors @ vector, -1.0)
+        best = int(scores.argmax())
+        return best, float(scores[best])
+
+    def add(self, vector: np.ndarray, entry: _Entry) -> None:
+        if len(self.entries) >= self.max_entries:
+            # Evict the least recently used answer
+            self.remove([min(range(len(self.entries)), key=lambda i: self.entries[i].last_used)])
+        self.vectors = np.vstack([self.vectors, vector[None, :]])
+        self.entries.append(entry)
+
+    def remove(self, indexes: List[int]) -> None:
+        if not indexes:
+            return
+        keep = [i for i in range(len(self.entries)) if i not in set(indexes)]
+        self.vectors = self.vectors[keep]
+        self.entries = [self.entries[i] for i in keep]
+
+
+class SemanticCache:
+    """
+    Per-topic cache of previous VTA answers, looked up by question similarity.
+    Answers are also keyed by the tone bucket and the profile (context, likes) the system
+    prompt adapts to, so a student showing distress is never served an answer written for a
+    neutral one, and every analogy is built on the asking student's own interests.
+    Follow-ups ("explain that more simply") only match answers given after the same previous
+    VTA turn; opening questions only match other opening questions.
+    """
+
+    def __init__(self, embedder, threshold: Optional[float] = None, max_entries_per_topic: int = 500,
+                 max_topics: int = 200, ttl: int = 7 * 24 * 3600):
+        self.embedder = embedder
+        self.threshold = threshold if threshold is not None else embedder.default_threshold
+        self.max_entries_per_topic = max_entries_per_topic
+        self.max_topics = max_topics
+        self.ttl = ttl
+        self._indexes: 'OrderedDict[Tuple[str, str, str], TopicIndex]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(topic: str, facial_emotion: Optional[str], context: Optional[str], likes: Optional[str]) -> Tuple[str, str, str]:
+        mood = 'neutral' if not facial_emotion or facial_emotion.upper() == 'NEUTRAL' else 'support'
+        # Likes are stored comma-separated in whatever order the student picked them
+        interests = ','.join(sorted({like.strip().lower() for like in (likes or '').split(',') if like.strip()}))
+        profile = f"{' '.join((context or '').lower().split())}|{interests}"
+        return ' '.join(topic.lower().split()), mood, profile
+
+    @staticmethod
+    def _follows(previous_answer: Optional[str], username: str) -> str:
+        # Fingerprint of the turn being followed up; cached answers were renamed for each student
+        if not previous_answer:
+            return ''
+        if username:
+            previous_answer = re.sub(rf'\b{re.escape(username)}\b', '\x00', previous_answer)
+        return hashlib.sha1(' '.join(previous_answer.split()).encode('utf-8')).hexdigest()
+
+    def lookup(self, topic: str, question: str, username: str, facial_emotion: Optional[str] = None,
+               context: Optional[str] = None, likes: Optional[str] = None,
+               previous_answer: Optional[str] = None) -> Optional[str]:
+        start = time.perf_counter()
+        vector = self.embedder.embed(question)
+        key = self._key(topic, facial_emotion, context, likes)
+        follows = self._follows(previous_answer, username)
+        answer = None
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._expire(index)
+                best, score = index.search(vector, follows)
+                SEMANTIC_CACHE_SIMILARITY.observe(score)
+                if best >= 0 and score >= self.threshold:
+                    entry = index.entries[best]
+                    entry.hits += 1
+                    entry.last_used = time.time()
+                    answer = self._personalize(entry, username)
+        SEMANTIC_CACHE_LATENCY.observe(time.perf_counter() - start)
+        SEMANTIC_CACHE_LOOKUPS.inc(result='hit' if answer else 'miss')
+        return answer
+
+    def store(self, topic: str, question: str, answer: str, username: str, conversation_id: int,
+              facial_emotion: Optional[str] = None, context: Optional[str] = None, likes: Optional[str] = None,
+              previous_answer: Optional[str] = None) -> None:
+        vector = self.embedder.embed(question)
+        key = self._key(topic, facial_emotion, context, likes)
+        follows = self._follows(previous_answer, username)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                if len(self._indexes) >= self.max_topics:
+                    self._indexes.popitem(last=False)
+                index = self._indexes[key] = TopicIndex(vector.shape[0], self.max_entries_per_topic)
+            self._indexes.move_to_end(key)
+            index.add(vector, _Entry(question, answer, username, conversation_id, follows))
+            self._update_size()
+
+    def invalidate_topic(self, topic: str) -> None:
+        normalized = ' '.join(topic.lower().split())
+        with self._lock:
+            for key in [k for k in self._indexes if k[0] == normalized]:
+                del self._indexes[key]
+            self._update_size()
+
+    def invalidate_conversation(self, conversation_id: int) -> None:
+        """Drops answers a conversation contributed, e.g. when its topic changes and they no longer belong."""
+        with self._lock:
+            for index in self._indexes.values():
+                index.remove([i for i, e in enumerate(index.entries) if e.conversation_id == conversation_id])
+            self._update_size()
+
+    def _expire(self, index: TopicIndex) -> None:
+        cutoff = time.time() - self.ttl
+        index.remove([i for i, e in enumerate(index.entries) if e.created_at < cutoff])
+
+    def _update_size(self) -> None:
+        SEMANTIC_CACHE_ENTRIES.set(sum(len(index.entries) for index in self._indexes.values()))
+
+    @staticmethod
+    def _personalize(entry: _Entry, username: str) -> str:
+        # Answers greet the student by name; swap in the current student's name
+        if entry.username and username and entry.username != username:
+            return re.sub(rf'\b{re.escape(entry.username)}\b', username, entry.answer)
+        return entry.answer
+
+
+def create_semantic_cache() -> Optional[SemanticCache]:
+    """Opt-in via SEMANTIC_CACHE_ENABLED=1; returns None when disabled or no embedding model loads."""
+    if os.environ.get('SEMANTIC_CACHE_ENABLED', '0') != '1':
+        return None
+    embedder = create_embedder(os.environ.get('SEMANTIC_CACHE_MODEL', 'sentence-transformers/all-MiniLM-L6-v2'))
+    if embedder is None:
+        return None
+    threshold = os.environ.get('SEMANTIC_CACHE_THRESHOLD')
+    return SemanticCache(
+        embedder,
+        threshold=float(threshold) if threshold else None,
+        max_entries_per_topic=int(os.environ.get('SEMANTIC_CACHE_MAX_ENTRIES', 500)),
+        max_topics=int(os.environ.get('SEMANTIC_CACHE_MAX_TOPICS', 200)),
+        ttl=int(os.environ.get('SEMANTIC_CACHE_TTL', 7 * 24 * 3600)),
+    )
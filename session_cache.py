@@ -0,0 +1,134 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+DEFAULT_TTL = 300  # seconds a snapshot may be served without touching the DB
+SOCKET_TOKEN_SALT = 'vta-socketio-auth'
+SOCKET_TOKEN_MAX_AGE = 12 * 3600
+
+
+class UserSnapshot:
+    """
+    Compact, read-only copy of the User fields request handlers read.
+    Attribute names match the User model so handlers can use either interchangeably for reads;
+    writes must go through the ORM object (get_current_user()) and then invalidate the cache.
+    """
+    FIELDS = ('id', 'name', 'username', 'email', 'likes', 'dislikes', 'context', 'theme',
+              'xp', 'level', 'opal_gems', 'streak', 'badge_ids')
+    __slots__ = FIELDS
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            setattr(self, field, values.get(field))
+
+    @classmethod
+    def from_user(cls, user) -> 'UserSnapshot':
+        values = {field: getattr(user, field) for field in cls.FIELDS if field != 'badge_ids'}
+        values['badge_ids'] = [badge.id for badge in user.badges]
+        return cls(**values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'UserSnapshot':
+        return cls(**data)
+
+
+class MemoryBackend:
+    """Per-process LRU with TTL. Invalidation only reaches this process; use RedisBackend with several workers."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisBackend:
+    """Shared across workers, so an invalidation on one worker is seen by all of them."""
+
+    def __init__(self, url: str):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = self._redis.get(key)
+        return json.loads(raw) if raw else None
+
+    def set(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        self._redis.set(key, json.dumps(value), ex=ttl)
+
+    def delete(self, key: str) -> None:
+        self._redis.delete(key)
+
+
+def create_backend(url: Optional[str] = None):
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    return MemoryBackend()
+
+
+class UserCache:
+    def __init__(self, backend=None, ttl: int = DEFAULT_TTL):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f'vta:user:{user_id}'
+
+    def get(self, user_id: int, loader: Callable[[int], Optional[UserSnapshot]]) -> Optional[UserSnapshot]:
+        key = self._key(user_id)
+        cached = self.backend.get(key)
+        if cached is not None:
+            return UserSnapshot.from_dict(cached)
+        snapshot = loader(user_id)
+        if snapshot is not None:
+            self.backend.set(key, snapshot.to_dict(), self.ttl)
+        return snapshot
+
+    def invalidate(self, user_id: int) -> None:
+        self.backend.delete(self._key(user_id))
+
+
+# --- SIGNED SOCKET TOKENS ---
+def issue_socket_token(secret_key: str, user_id: int) -> str:
+    return URLSafeTimedSerializer(secret_key, salt=SOCKET_TOKEN_SALT).dumps({'uid': user_id})
+
+
+def verify_socket_token(secret_key: str, token: Optional[str], max_age: int = SOCKET_TOKEN_MAX_AGE) -> Optional[int]:
+    """Returns the user id carried by a valid, unexpired token; None otherwise. Never touches the DB."""
+    if not token:
+        return None
+    try:
+        data = URLSafeTimedSerializer(secret_key, salt=SOCKET_TOKEN_SALT).loads(token, max_age=max_age)
+    except (BadSignature, SignatureExpired):
+        return None
+    return data.get('uid')
@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+
+from llm_client import (CircuitBreaker, LLMProviderError, LLMTimeoutError, LLMUnavailableError,
+                        ResilientLLMClient)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f'HTTP {status_code}')
+        self.status_code = status_code
+
+
+class FakeProvider:
+    """attempt() stand-in: answers per model from a script of results, exceptions or delays."""
+
+    def __init__(self, **behaviour):
+        self.behaviour = behaviour
+        self.calls = []
+        self.release = threading.Event()
+
+    def __call__(self, llm, model_name, on_chunk):
+        self.calls.append(model_name)
+        outcome = self.behaviour[model_name]
+        if callable(outcome):
+            outcome = outcome()
+        if isinstance(outcome, BaseException):
+            raise outcome
+        if isinstance(outcome, float):
+            self.release.wait(outcome)
+            return f'{model_name} (slow)'
+        if on_chunk:
+            on_chunk(outcome)
+        return outcome
+
+
+def make_client(**overrides):
+    options = dict(deadline=5.0, attempt_timeout=2.0, max_retries=2, backoff=0.0, hedge=False,
+                   breaker_failures=3, breaker_reset=30.0, max_workers=8)
+    options.update(overrides)
+    return ResilientLLMClient(['primary', 'fallback'], lambda name: name, **options)
+
+
+def test_falls_back_after_retrying_server_errors():
+    client = make_client()
+    provider = FakeProvider(primary=StatusError(503), fallback='from fallback')
+    assert client.call(provider) == 'from fallback'
+    assert provider.calls == ['primary'] * 3 + ['fallback']
+
+
+def test_rate_limits_are_retried():
+    responses = iter([StatusError(429), 'second try'])
+    client = make_client()
+    provider = FakeProvider(primary=lambda: next(responses), fallback='unused')
+    assert client.call(provider) == 'second try'
+    assert provider.calls == ['primary', 'primary']
+
+
+@pytest.mark.parametrize('status', [400, 401, 404])
+def test_client_errors_fail_without_retry_or_breaker_failure(status):
+    client = make_client(breaker_failures=2)
+    provider = FakeProvider(primary=StatusError(status), fallback='unused')
+    for _ in range(3):
+        with pytest.raises(LLMProviderError) as raised:
+            client.call(provider)
+        assert raised.value.cause.status_code == status
+    assert provider.calls == ['primary'] * 3
+    assert not client.primary.breaker.is_open
+
+
+def test_breaker_opens_then_lets_one_trial_through():
+    client = make_client(max_retries=0, breaker_failures=2, breaker_reset=0.1)
+    provider = FakeProvider(primary=StatusError(500), fallback='from fallback')
+    for _ in range(2):
+        assert client.call(provider) == 'from fallback'
+    assert client.primary.breaker.is_open
+
+    provider.calls.clear()
+    assert client.call(provider) == 'from fallback'
+    assert provider.calls == ['fallback']  # failed fast, primary not asked
+
+    time.sleep(0.15)
+    provider.behaviour['primary'] = 'recovered'
+    assert client.call(provider) == 'recovered'
+    assert not client.primary.breaker.is_open
+
+
+def test_all_breakers_open_fails_fast():
+    client = make_client(max_retries=0, breaker_failures=1)
+    provider = FakeProvider(primary=StatusError(500), fallback=StatusError(502))
+    with pytest.raises(LLMProviderError):
+        client.call(provider)
+    provider.calls.clear()
+    with pytest.raises(LLMUnavailableError):
+        client.call(provider)
+    assert provider.calls == []
+
+
+def test_half_open_breaker_allows_a_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release_trial()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open and not breaker.allow()
+
+
+def test_deadline_timeout_does_not_count_against_the_breaker():
+    client = make_client(deadline=0.2, attempt_timeout=5.0)
+    provider = FakeProvider(primary=10.0, fallback='unused')
+    started = time.monotonic()
+    try:
+        with pytest.raises(LLMTimeoutError):
+            client.call(provider)
+        assert time.monotonic() - started < 1.0
+        assert client.primary.breaker._failures == 0
+        assert client.primary.breaker.allow()
+    finally:
+        provider.release.set()
+
+
+def test_attempt_timeout_counts_and_falls_back():
+    client = make_client(attempt_timeout=0.1, max_retries=0)
+    provider = FakeProvider(primary=10.0, fallback='from fallback')
+    try:
+        assert client.call(provider) == 'from fallback'
+        assert client.primary.breaker._failures == 1
+    finally:
+        provider.release.set()
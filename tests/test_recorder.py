@@ -0,0 +1,42 @@
+import base64
+import time
+
+import pytest
+
+from video_analysis.recorder import FrameRecorder, read_recording
+
+FRAME = 'data:image/jpeg;base64,' + base64.b64encode(b'\xff\xd8jpeg bytes').decode()
+
+
+def test_records_arrival_time_not_completion_time(tmp_path):
+    path = str(tmp_path / 'session.vrec')
+    recorder = FrameRecorder(path)
+    first = time.perf_counter()
+    second = first + 0.1
+    # The second frame's analysis finished first; the recording keeps the arrival times
+    recorder.record('sid-a', FRAME, 'Happy', received_at=second)
+    time.sleep(0.2)  # a slow handler
+    recorder.record('sid-a', FRAME, 'Sad', received_at=first)
+    recorder.close()
+
+    records = list(read_recording(path))
+    assert [r.label for r in records] == ['Happy', 'Sad']
+    assert records[0].timestamp - records[1].timestamp == pytest.approx(0.1, abs=1e-6)
+    assert all(r.frame == FRAME for r in records)
+
+
+def test_appending_continues_after_the_latest_arrival(tmp_path):
+    path = str(tmp_path / 'session.vrec')
+    recorder = FrameRecorder(path)
+    now = time.perf_counter()
+    recorder.record('sid-a', FRAME, 'Happy', received_at=now + 5.0)
+    recorder.record('sid-a', FRAME, 'Sad', received_at=now + 1.0)
+    recorder.close()
+
+    recorder = FrameRecorder(path)
+    recorder.record('sid-b', FRAME, 'Neutral')
+    recorder.close()
+    records = list(read_recording(path))
+    assert records[-1].client == 1
+    assert records[-1].timestamp >= max(r.timestamp for r in records[:-1])
+
@@ -0,0 +1,55 @@
+import json
+import uuid
+
+from flask import Flask
+from flask_socketio import SocketIO, join_room
+
+from scale_out import LocalQueueManager, push_to_user, user_room
+
+
+def make_worker(channel):
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode='threading', client_manager=LocalQueueManager('local://', channel=channel))
+    # Run handlers inline so each polling request sees their effects
+    socketio.server.async_handlers = False
+    socketio.server.eio.async_handlers = False
+    return app, socketio
+
+
+class PollingClient:
+    """Minimal Engine.IO long-polling client speaking to a worker through its WSGI app."""
+
+    def __init__(self, app):
+        self.http = app.test_client()
+        body = self._get('/socket.io/?EIO=4&transport=polling')
+        self.sid = json.loads(body[0][1:])['sid']
+
+    def _get(self, url):
+        return self.http.get(url).get_data(as_text=True).split('\x1e')
+
+    def connect(self, auth):
+        self.http.post(f'/socket.io/?EIO=4&transport=polling&sid={self.sid}', data='40' + json.dumps(auth))
+        assert self.poll()[0].startswith('40')
+
+    def poll(self):
+        return self._get(f'/socket.io/?EIO=4&transport=polling&sid={self.sid}')
+
+
+def test_push_to_user_reaches_client_on_another_worker():
+    channel = f'test-{uuid.uuid4().hex}'
+    app_a, socketio_a = make_worker(channel)
+    app_b, socketio_b = make_worker(channel)
+
+    @socketio_b.on('connect')
+    def handle_connect(auth):
+        join_room(user_room(auth['uid']))
+
+    client = PollingClient(app_b)
+    client.connect({'uid': 7})
+
+    # Worker A has no connection for this user; the event must travel over the queue
+    push_to_user(socketio_a, 8, 'notice', {'text': 'not for you'})
+    push_to_user(socketio_a, 7, 'notice', {'text': 'quiz ready'})
+
+    packets = client.poll()
+    assert packets == ['42' + json.dumps(['notice', {'text': 'quiz ready'}], separators=(',', ':'))]
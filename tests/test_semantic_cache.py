@@ -0,0 +1,52 @@
+import zlib
+
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+
+class FakeEmbedder:
+    """Identical text embeds identically; different text is close to orthogonal."""
+    default_threshold = 0.9
+
+    def embed(self, text):
+        vector = np.random.default_rng(zlib.crc32(text.encode())).standard_normal(64).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+
+def make_cache():
+    return SemanticCache(FakeEmbedder())
+
+
+def test_opening_question_is_shared_and_renamed():
+    cache = make_cache()
+    cache.store('Biology', 'What is photosynthesis?', 'Great question, alice! Plants make food.', 'alice', 1)
+    assert cache.lookup('biology', 'What is photosynthesis?', 'bob') == 'Great question, bob! Plants make food.'
+
+
+def test_same_follow_up_after_different_previous_turns_is_a_miss():
+    cache = make_cache()
+    follow_up = 'Can you explain that more simply?'
+    cache.store('Biology', follow_up, 'Simpler: plants eat light.', 'alice', 1,
+                previous_answer='Photosynthesis turns light into sugar, alice.')
+
+    assert cache.lookup('Biology', follow_up, 'bob', previous_answer='Mitosis splits one cell into two, bob.') is None
+    assert cache.lookup('Biology', follow_up, 'bob') is None
+    # After the same (renamed) previous answer the follow-up means the same thing
+    assert cache.lookup('Biology', follow_up, 'bob',
+                        previous_answer='Photosynthesis turns light into sugar, bob.') == 'Simpler: plants eat light.'
+
+
+def test_follow_up_answers_are_not_served_to_opening_questions():
+    cache = make_cache()
+    cache.store('Biology', 'Give me another example', 'Another example: cacti.', 'alice', 1,
+                previous_answer='Plants adapt to deserts.')
+    assert cache.lookup('Biology', 'Give me another example', 'bob') is None
+
+
+def test_profile_and_mood_are_part_of_the_key():
+    cache = make_cache()
+    cache.store('Biology', 'What is a cell?', 'Like a football team...', 'alice', 1, context='a student', likes='football')
+    assert cache.lookup('Biology', 'What is a cell?', 'bob', context='a student', likes='music') is None
+    assert cache.lookup('Biology', 'What is a cell?', 'bob', 'Sad', context='a student', likes='football') is None
+    assert cache.lookup('Biology', 'What is a cell?', 'bob', context='a student', likes='Football ') == 'Like a football team...'
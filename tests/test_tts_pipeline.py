@@ -0,0 +1,32 @@
+import pytest
+
+from tts_pipeline import SentenceChunker, split_into_sentences, strip_markdown
+
+
+@pytest.mark.parametrize('text, spoken', [
+    ('`__init__`', '__init__'),
+    ('`__name__ == "__main__"`', '__name__ == "__main__"'),
+    ('`a*b*c`', 'a*b*c'),
+    ('Call `**kwargs` here', 'Call **kwargs here'),
+    ('F = m*a', 'F = m*a'),
+    ('area = 2*r*h', 'area = 2*r*h'),
+    ('the snake_case_name stays', 'the snake_case_name stays'),
+    ('**Great** job, *really* _well_ done ~~not~~', 'Great job, really well done not'),
+    ('## Step 1\n- use `x_1`', 'Step 1\nuse x_1'),
+])
+def test_strip_markdown_keeps_code_and_formulas(text, spoken):
+    assert strip_markdown(text) == spoken
+
+
+def test_chunker_keeps_code_across_deltas():
+    chunker = SentenceChunker(min_chars=5)
+    chunks = []
+    for delta in ['Define `__in', 'it__` first. ', 'Then F = m*a holds. ', 'Done']:
+        chunks += chunker.feed(delta)
+    chunks += chunker.flush()
+    assert chunks == ['Define __init__ first.', 'Then F = m*a holds.', 'Done']
+
+
+def test_split_into_sentences_strips_emphasis_only():
+    assert split_into_sentences('**Note:** `a*b*c` is code. Keep *going*!', min_chars=5) == [
+        'Note: a*b*c is code.', 'Keep going!']
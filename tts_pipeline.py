@@ -0,0 +1,153 @@
+import re
+import queue
+import threading
+from typing import Callable, Iterable, List, Optional
+
+# Smallest chunk handed to the TTS engine; shorter fragments are merged with the next one
+MIN_CHUNK_CHARS = 20
+
+# A sentence ends at . ! ? (optionally followed by closing quotes/brackets) and whitespace,
+# or at a line break - markdown headings and list items are natural spoken chunks.
+SENTENCE_BOUNDARY_RE = re.compile(r'(?<=[.!?])["\')\]]*\s+|\n+')
+
+_CODE_FENCE_RE = re.compile(r'```.*?(```|$)', re.DOTALL)
+_INLINE_CODE_RE = re.compile(r'`([^`]*)`')
+_LINK_RE = re.compile(r'!?\[([^\]]*)\]\([^)]*\)')
+_HEADING_RE = re.compile(r'^\s{0,3}#{1,6}\s*', re.MULTILINE)
+_LIST_MARKER_RE = re.compile(r'^\s*(?:[*+\-]|\d+\.)\s+', re.MULTILINE)
+# Emphasis markers only count at word boundaries, so snake_case names and formulas like m*a survive
+_EMPHASIS_RE = re.compile(r'(?<!\w)(\*{1,3}|_{1,3}|~~)(?=\S)(.+?)(?<=\S)\1(?!\w)')
+_CODE_PLACEHOLDER_RE = re.compile('\x00(\\d+)\x00')
+_RULE_RE = re.compile(r'^\s*(?:-{3,}|\*{3,}|_{3,})\s*$', re.MULTILINE)
+_EMOJI_RE = re.compile('[\\U0001F000-\\U0001FAFF\\u2600-\\u27BF\\uFE0F\\u200D]')
+
+
+def strip_markdown(text: str) -> str:
+    """Removes the markdown/emoji decoration the VTA system prompt asks for so it is not read aloud."""
+    text = _CODE_FENCE_RE.sub(' ', text)
+    # Inline code is read verbatim: park it behind placeholders while the other passes run
+    code_spans: List[str] = []
+
+    def _park(match):
+        code_spans.append(match.group(1))
+        return f'\x00{len(code_spans) - 1}\x00'
+
+    text = _INLINE_CODE_RE.sub(_park, text)
+    text = _LINK_RE.sub(r'\1', text)
+    text = _RULE_RE.sub('', text)
+    text = _HEADING_RE.sub('', text)
+    text = _LIST_MARKER_RE.sub('', text)
+    text = _EMPHASIS_RE.sub(r'\2', text)
+    text = _EMOJI_RE.sub('', text)
+    text = _CODE_PLACEHOLDER_RE.sub(lambda m: code_spans[int(m.group(1))], text)
+    return re.sub(r'[ \t]+', ' ', text).strip()
+
+
+class SentenceChunker:
+    """
+    Incrementally splits streamed text into sentence-sized, speakable chunks.
+    Feed it LLM deltas as they arrive; every completed sentence is returned immediately.
+    """
+
+    def __init__(self, min_chars: int = MIN_CHUNK_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ''
+        self._pending = ''
+
+    def feed(self, delta: str) -> List[str]:
+        self._buffer += delta
+        chunks = []
+        while True:
+            match = SENTENCE_BOUNDARY_RE.search(self._buffer)
+            if not match:
+                break
+            sentence = self._buffer[:match.end()]
+            self._buffer = self._buffer[match.end():]
+            chunk = self._merge(sentence)
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def flush(self) -> List[str]:
+        remainder = strip_markdown(self._pending + self._buffer)
+        self._buffer = ''
+        self._pending = ''
+        return [remainder] if remainder else []
+
+    def _merge(self, sentence: str) -> Optional[str]:
+        # Very short fragments ("1.", "Great!") sound choppy on their own; hold them for the next sentence
+        self._pending += sentence
+        spoken = strip_markdown(self._pending)
+        if len(spoken) < self.min_chars:
+            return None
+        self._pending = ''
+        return spoken
+
+
+def split_into_sentences(text: str, min_chars: int = MIN_CHUNK_CHARS) -> List[str]:
+    chunker = SentenceChunker(min_chars)
+    return chunker.feed(text) + chunker.flush()
+
+
+class IncrementalSpeaker:
+    """
+    Speaks queued chunks in order on a single background thread.
+    Each chunk is synthesized as soon as it is queued, so playback starts after the
+    first sentence instead of after the entire response.
+    """
+
+    _DONE = object()
+
+    def __init__(self, engine_factory: Callable, lock: Optional[threading.Lock] = None):
+        self._engine_factory = engine_factory
+        self._lock = lock or threading.Lock()
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._engine = None
+        self.is_speaking = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, chunk: str) -> None:
+        if chunk and not self._stopped.is_set():
+            self._queue.put(chunk)
+
+    def extend(self, chunks: Iterable[str]) -> None:
+        for chunk in chunks:
+            self.put(chunk)
+
+    def close(self) -> None:
+        """Marks the end of the response; the worker exits once the queue drains."""
+        self._queue.put(self._DONE)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        # Drop everything not yet spoken, then interrupt the chunk currently playing
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._queue.put(self._DONE)
+        if self._engine is not None:
+            try:
+                self._engine.stop()
+            except Exception:
+                pass
+
+    def _run(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is self._DONE or self._stopped.is_set():
+                break
+            with self._lock:
+                self.is_speaking = True
+                try:
+                    self._engine = self._engine_factory()
+                    self._engine.say(chunk)
+                    self._engine.runAndWait()
+                except Exception as e:
+                    print(f"Incremental TTS chunk failed: {e}")
+                finally:
+                    self.is_speaking = False
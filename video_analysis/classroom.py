@@ -0,0 +1,188 @@
+import threading
+from typing import Any, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from metrics import VIDEO_STAGE_LATENCY, registry
+from video_analysis.video_analysis import FACE_CLASSIFIER, VIDEO_CLASSIFIER, EMOTION_LABELS, decode_frame
+
+CLASSROOM_FACES = registry.histogram('vta_classroom_faces_per_frame', 'Faces detected per classroom frame.',
+                                     buckets=(0, 1, 2, 5, 10, 15, 20, 30, 40, 60))
+
+# Room cameras see smaller faces than a webcam, so detection is finer than analyze_video_frame's 1.3
+DETECT_SCALE_FACTOR = 1.1
+DETECT_MIN_NEIGHBORS = 5
+DETECT_MIN_SIZE = (24, 24)
+# Wider frames are downscaled before detection; the cascade's cost grows with pixel count
+MAX_DETECT_WIDTH = 1280
+
+# Emotion -> stress level for room-level aggregates, and the weight of each level in the stress index
+STRESS_LEVELS = {'Angry': 'high', 'Fear': 'high', 'Disgust': 'moderate', 'Sad': 'moderate',
+                 'Surprise': 'moderate', 'Happy': 'low', 'Neutral': 'low'}
+STRESS_WEIGHTS = {'low': 0.0, 'moderate': 0.5, 'high': 1.0}
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of (N, 4) and (M, 4) boxes given as x, y, w, h."""
+    ax1, ay1, ax2, ay2 = a[:, 0:1], a[:, 1:2], a[:, 0:1] + a[:, 2:3], a[:, 1:2] + a[:, 3:4]
+    bx1, by1, bx2, by2 = b[:, 0], b[:, 1], b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    inter_w = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    inter_h = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    intersection = inter_w * inter_h
+    union = (a[:, 2:3] * a[:, 3:4]) + (b[:, 2] * b[:, 3]) - intersection
+    return intersection / np.maximum(union, 1e-9)
+
+
+class FaceTracker:
+    """
+    Keeps stable face ids across frames of one camera with greedy IoU association,
+    and smooths each face's emotion probabilities so labels do not flicker.
+    `busy` is held while a frame of this camera is analyzed; callers drop frames that
+    arrive meanwhile instead of queueing them behind a slow one.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_missed: int = 5, smoothing: float = 0.6):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.smoothing = smoothing
+        self.tracks: Dict[int, Dict[str, Any]] = {}
+        self._next_id = 1
+        self.busy = threading.Lock()
+        self._lock = threading.Lock()
+
+    def update(self, boxes: np.ndarray, probabilities: np.ndarray) -> List[int]:
+        """Assigns a track id to every box and returns the ids in box order."""
+        with self._lock:
+            return self._update(boxes, probabilities)
+
+    def track(self, boxes: np.ndarray, probabilities: np.ndarray) -> Tuple[List[int], np.ndarray]:
+        """update() plus the smoothed probabilities of the returned tracks, read under the same lock."""
+        with self._lock:
+            track_ids = self._update(boxes, probabilities)
+            return track_ids, np.stack([self.tracks[t]['probs'] for t in track_ids])
+
+    def _update(self, boxes: np.ndarray, probabilities: np.ndarray) -> List[int]:
+        track_ids = list(self.tracks)
+        assigned = [0] * len(boxes)
+
+        if track_ids and len(boxes):
+            previous = np.array([self.tracks[t]['box'] for t in track_ids], dtype=np.float32)
+            overlaps = iou_matrix(previous, boxes.astype(np.float32))
+            # Greedy: best overlapping pairs first; good enough for faces that barely move between frames
+            for flat in np.argsort(overlaps, axis=None)[::-1]:
+                t, d = divmod(int(flat), len(boxes))
+                if overlaps[t, d] < self.iou_threshold:
+                    break
+                if assigned[d] or self.tracks[track_ids[t]].get('matched'):
+                    continue
+                assigned[d] = track_ids[t]
+                self.tracks[track_ids[t]]['matched'] = True
+
+        for d, box in enumerate(boxes):
+            track_id = assigned[d]
+            if not track_id:
+                track_id = assigned[d] = self._next_id
+                self._next_id += 1
+                self.tracks[track_id] = {'probs': probabilities[d], 'missed': 0}
+            track = self.tracks[track_id]
+            track['box'] = box.tolist()
+            track['missed'] = 0
+            track['probs'] = self.smoothing * probabilities[d] + (1 - self.smoothing) * track['probs']
+
+        for track_id in list(self.tracks):
+            track = self.tracks[track_id]
+            if not track.pop('matched', False) and track_id not in assigned:
+                track['missed'] += 1
+                if track['missed'] > self.max_missed:
+                    del self.tracks[track_id]
+        return assigned
+
+
+def detect_faces(frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the grayscale frame and the (N, 4) face boxes in its coordinates."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    scale = 1.0
+    if gray.shape[1] > MAX_DETECT_WIDTH:
+        scale = MAX_DETECT_WIDTH / gray.shape[1]
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    else:
+        small = gray
+    faces = FACE_CLASSIFIER.detectMultiScale(small, DETECT_SCALE_FACTOR, DETECT_MIN_NEIGHBORS, minSize=DETECT_MIN_SIZE)
+    if len(faces) == 0:
+        return gray, np.zeros((0, 4), dtype=np.int32)
+    boxes = np.round(np.asarray(faces) / scale).astype(np.int32)
+    # Rounding back to full resolution can push a box past the frame edge
+    boxes[:, 2] = np.minimum(boxes[:, 2], gray.shape[1] - boxes[:, 0])
+    boxes[:, 3] = np.minimum(boxes[:, 3], gray.shape[0] - boxes[:, 1])
+    return gray, boxes
+
+
+def classify_faces(gray: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """One batched forward pass over all face ROIs; returns (N, len(EMOTION_LABELS)) probabilities."""
+    batch = np.empty((len(boxes), 48, 48, 1), dtype=np.float32)
+    for i, (x, y, w, h) in enumerate(boxes):
+        batch[i, :, :, 0] = cv2.resize(gray[y:y+h, x:x+w], (48, 48), interpolation=cv2.INTER_AREA)
+    batch /= 255.0
+    # Calling the model directly skips predict()'s per-call dataset/callback setup
+    return np.asarray(VIDEO_CLASSIFIER(batch, training=False))
+
+
+def summarize_room(faces: List[Dict[str, Any]], probabilities: np.ndarray) -> Dict[str, Any]:
+    if not faces:
+        return {'face_count': 0, 'emotions': {}, 'stress': {}, 'dominant_emotion': None, 'stress_index': None}
+    mean_probs = probabilities.mean(axis=0)
+    stress_counts = {level: 0 for level in STRESS_WEIGHTS}
+    for face in faces:
+        stress_counts[face['stress']] += 1
+    stress_index = sum(STRESS_WEIGHTS[STRESS_LEVELS[label]] * float(p) for label, p in zip(EMOTION_LABELS, mean_probs))
+    return {
+        'face_count': len(faces),
+        'emotions': {label: round(float(p), 4) for label, p in zip(EMOTION_LABELS, mean_probs)},
+        'stress': {level: round(count / len(faces), 4) for level, count in stress_counts.items()},
+        'dominant_emotion': EMOTION_LABELS[int(mean_probs.argmax())],
+        'stress_index': round(stress_index, 4),
+    }
+
+
+def analyze_classroom_frame(base64_frame: str, tracker: FaceTracker) -> Dict[str, Any]:
+    """
+    Classroom-camera mode: classifies every face in the frame and returns per-face results
+    (tracked ids, boxes, emotion, stress) plus room-level emotion and stress distributions.
+    """
+    if not FACE_CLASSIFIER or not VIDEO_CLASSIFIER:
+        return {'error': 'Model Error'}
+
+    try:
+        frame = decode_frame(base64_frame)
+        if frame is None:
+            return {'faces': [], 'room': summarize_room([], None)}
+
+        with VIDEO_STAGE_LATENCY.time(stage='detect'):
+            gray, boxes = detect_faces(frame)
+        # Drop degenerate boxes clipped by the frame edge
+        boxes = boxes[(boxes[:, 2] > 0) & (boxes[:, 3] > 0)]
+        CLASSROOM_FACES.observe(len(boxes))
+        if len(boxes) == 0:
+            tracker.update(boxes, np.zeros((0, len(EMOTION_LABELS)), dtype=np.float32))
+            return {'faces': [], 'room': summarize_room([], None)}
+
+        with VIDEO_STAGE_LATENCY.time(stage='predict'):
+            raw_probs = classify_faces(gray, boxes)
+
+        track_ids, smoothed = tracker.track(boxes, raw_probs)
+        faces = []
+        for track_id, box, probs in zip(track_ids, boxes, smoothed):
+            label = EMOTION_LABELS[int(probs.argmax())]
+            faces.append({
+                'id': track_id,
+                'box': [int(v) for v in box],
+                'emotion': label,
+                'confidence': round(float(probs.max()), 4),
+                'stress': STRESS_LEVELS[label],
+            })
+        return {'faces': faces, 'room': summarize_room(faces, smoothed)}
+
+    except Exception as e:
+        print(f"Classroom analysis exception: {e}")
+        return {'error': 'Analysis Error'}
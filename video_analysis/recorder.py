@@ -0,0 +1,132 @@
+import os
+import time
+import base64
+import binascii
+import struct
+import threading
+from typing import BinaryIO, Dict, Iterator, NamedTuple, Optional
+
+# File layout: MAGIC, then records appended back to back. Each record is a fixed header
+#   seconds from recording start to the frame's arrival (float64), client number (uint16),
+#   data-URL prefix length (uint8), label length (uint8), image length (uint32)
+# followed by the prefix ('data:image/jpeg;base64'), the emotion label the server answered
+# with, and the raw image bytes. Storing the decoded JPEG keeps files ~25% smaller than Base64.
+# Records are written when the answer is known, so with threaded handlers they can be slightly
+# out of arrival order; readers that need the client's cadence sort by timestamp.
+MAGIC = b'VTAREC\x00\x01'
+RECORD_HEADER = struct.Struct('<dHBBI')
+
+
+class FrameRecord(NamedTuple):
+    timestamp: float
+    client: int
+    frame: str
+    label: str
+
+
+class FrameRecorder:
+    """
+    Opt-in, append-only recorder for frames arriving on the video_stream event.
+    Writes are serialized by a lock; the file is flushed per record so a crash loses at most one frame.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._clients: Dict[str, int] = {}
+        self._next_client = 0
+        self._started = time.perf_counter()
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        else:
+            # Appending to an earlier recording: cut off a record torn by a crash, and keep
+            # the timeline and client numbering going instead of restarting at 0
+            with open(path, 'rb') as f:
+                last_timestamp, end = 0.0, len(MAGIC)
+                for record in _read_records(f, path):
+                    last_timestamp, end = max(last_timestamp, record.timestamp), f.tell()
+                    self._next_client = max(self._next_client, record.client + 1) % 65536
+            self._file.truncate(end)
+            self._started -= last_timestamp
+        self._file.flush()
+
+    def record(self, sid: str, frame: Optional[str], label: str, received_at: Optional[float] = None) -> None:
+        """received_at is the time.perf_counter() value when the frame arrived (default: now)."""
+        if received_at is None:
+            received_at = time.perf_counter()
+        prefix, _, data = (frame or '').partition(',')
+        try:
+            image = base64.b64decode(data, validate=True)
+        except (binascii.Error, ValueError):
+            return  # Not a Base64 data URL; nothing a replay could send back
+        prefix_bytes = prefix.encode()[:255]
+        label_bytes = label.encode()[:255]
+
+        with self._lock:
+            if self._file is None:
+                return
+            if self.max_bytes and self._file.tell() >= self.max_bytes:
+                print(f"Frame recording stopped: {self.path} reached {self.max_bytes} bytes.")
+                self._close_locked()
+                return
+            client = self._clients.get(sid)
+            if client is None:
+                client = self._clients[sid] = self._next_client
+                self._next_client = (self._next_client + 1) % 65536
+            header = RECORD_HEADER.pack(received_at - self._started, client,
+                                        len(prefix_bytes), len(label_bytes), len(image))
+            self._file.write(header + prefix_bytes + label_bytes + image)
+            self._file.flush()
+
+    def forget(self, sid: str) -> None:
+        with self._lock:
+            self._clients.pop(sid, None)
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_locked()
+
+    def _close_locked(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_recording(path: str) -> Iterator[FrameRecord]:
+    """Yields the records of a recording in file order; a truncated last record is ignored."""
+    with open(path, 'rb') as f:
+        yield from _read_records(f, path)
+
+
+def _read_records(f: BinaryIO, path: str) -> Iterator[FrameRecord]:
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{path} is not a frame recording")
+    while True:
+        header = f.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return
+        timestamp, client, prefix_len, label_len, image_len = RECORD_HEADER.unpack(header)
+        body = f.read(prefix_len + label_len + image_len)
+        if len(body) < prefix_len + label_len + image_len:
+            return
+        prefix = body[:prefix_len].decode()
+        label = body[prefix_len:prefix_len + label_len].decode()
+        image = body[prefix_len + label_len:]
+        frame = f"{prefix},{base64.b64encode(image).decode()}" if prefix or image else ''
+        yield FrameRecord(timestamp, client, frame, label)
+
+
+def create_recorder() -> Optional[FrameRecorder]:
+    """
+    Opt-in via VIDEO_RECORD_PATH; returns None when unset. With several workers put '{pid}'
+    in the path so each process appends to its own file.
+    """
+    path = os.environ.get('VIDEO_RECORD_PATH')
+    if not path:
+        return None
+    path = path.format(pid=os.getpid())
+    max_mb = float(os.environ.get('VIDEO_RECORD_MAX_MB', 0))
+    print(f"Recording video_stream frames to {path}")
+    return FrameRecorder(path, max_bytes=int(max_mb * 1024 * 1024))
@@ -0,0 +1,176 @@
+"""
+Replays a frame recording (see recorder.py) through the app's video_stream (or classroom_stream) handler.
+
+    python -m video_analysis.replay recording.vrec                  # original speed, one client per recorded stream
+    python -m video_analysis.replay recording.vrec --speed 4        # four times faster
+    python -m video_analysis.replay recording.vrec --speed 0 --clients 8 --json
+    python -m video_analysis.replay classroom.vrec --event classroom_stream   # room-camera benchmark
+
+Reports end-to-end latency (from the frame's scheduled send time, so queueing behind a slow
+pipeline counts), frames dropped, label agreement with the recorded run, and throughput.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, List
+
+# The Flask-SocketIO test client needs the in-process threading server and refuses message queues,
+# and a replay must not record itself. Set before app is imported (load_dotenv does not override).
+os.environ['SOCKETIO_ASYNC_MODE'] = 'threading'
+os.environ['SOCKETIO_MESSAGE_QUEUE'] = ''
+os.environ['VIDEO_RECORD_PATH'] = ''
+
+from video_analysis.recorder import FrameRecord, read_recording
+
+ERROR_LABELS = ('Model Error', 'Analysis Error', 'Prediction Error')
+RESPONSE_EVENTS = {'video_stream': 'video_response', 'classroom_stream': 'classroom_response'}
+
+
+def response_label(event: str, payload: Dict[str, Any]) -> Any:
+    """The value compared with the recorded label: the emotion, or the room's dominant emotion."""
+    if event == 'classroom_stream':
+        return payload.get('error') or (payload.get('room') or {}).get('dominant_emotion') or 'Neutral'
+    return payload.get('emotion')
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ReplayClient(threading.Thread):
+    """One simulated browser: sends its frames on the recorded schedule and waits for each answer."""
+
+    def __init__(self, app, socketio, frames: List[FrameRecord], speed: float, timeout: float,
+                 auth: Dict[str, Any], event: str = 'video_stream'):
+        super().__init__(daemon=True)
+        self.client = socketio.test_client(app, auth=auth)
+        self.event = event
+        self.frames = frames
+        self.start_at = 0.0
+        self.speed = speed
+        self.timeout = timeout
+        self.results: List[Dict[str, Any]] = []
+
+    def run(self) -> None:
+        origin = self.frames[0].timestamp if self.frames else 0.0
+        for record in self.frames:
+            scheduled = self.start_at
+            if self.speed > 0:
+                scheduled += (record.timestamp - origin) / self.speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                scheduled = time.perf_counter()
+
+            self.client.emit(self.event, {'frame': record.frame})
+            # The threading test client runs the handler inline, so its answer is already queued
+            answers = [p['args'][0] for p in self.client.get_received() if p['name'] == RESPONSE_EVENTS[self.event]]
+            finished = time.perf_counter()
+            self.results.append({
+                'latency': finished - scheduled,
+                'expected': record.label,
+                'label': response_label(self.event, answers[-1]) if answers else None,
+                'faces': len(answers[-1].get('faces', [])) if answers and self.event == 'classroom_stream' else None,
+            })
+        self.client.disconnect()
+
+
+def summarize(results: List[Dict[str, Any]], wall_time: float, timeout: float) -> Dict[str, Any]:
+    latencies = [r['latency'] for r in results]
+    answered = [r for r in results if r['label'] is not None]
+    errors = [r for r in answered if r['label'] in ERROR_LABELS]
+    late = [r for r in answered if r['label'] not in ERROR_LABELS and r['latency'] > timeout]
+    compared = [r for r in answered if r['label'] not in ERROR_LABELS and r['expected'] not in ERROR_LABELS]
+    agreeing = sum(1 for r in compared if r['label'] == r['expected'])
+    mismatches = Counter(f"{r['expected']} -> {r['label']}" for r in compared if r['label'] != r['expected'])
+    faces = [r['faces'] for r in answered if r.get('faces') is not None]
+
+    report = {
+        'frames': len(results),
+        'wall_time_s': round(wall_time, 3),
+        'fps': round(len(results) / wall_time, 2) if wall_time else 0.0,
+        'latency_ms': {name: round(percentile(latencies, q) * 1000, 1)
+                       for name, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1.0))},
+        'dropped': {'no_response': len(results) - len(answered), 'error': len(errors), 'late': len(late)},
+        'label_agreement': round(agreeing / len(compared), 4) if compared else None,
+        'top_mismatches': dict(mismatches.most_common(5)),
+    }
+    if faces:
+        report['faces_per_frame'] = {'mean': round(sum(faces) / len(faces), 1), 'max': max(faces)}
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a recorded video_stream session through the app.")
+    parser.add_argument('recording', help="file written with VIDEO_RECORD_PATH")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="playback speed: 1 = as recorded, 4 = four times faster, 0 = as fast as possible")
+    parser.add_argument('--event', choices=sorted(RESPONSE_EVENTS), default='video_stream',
+                        help="SocketIO event to replay the frames on")
+    parser.add_argument('--clients', type=int, default=1,
+                        help="simulated clients per recorded stream (capacity tests)")
+    parser.add_argument('--timeout', type=float, default=1.0,
+                        help="answers later than this many seconds after the frame was due count as dropped")
+    parser.add_argument('--user-id', type=int, help="authenticate the sockets as this user (for SOCKETIO_REQUIRE_AUTH=1)")
+    parser.add_argument('--min-agreement', type=float,
+                        help="exit with status 1 when label agreement falls below this fraction")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    streams = defaultdict(list)
+    for record in read_recording(args.recording):
+        streams[record.client].append(record)
+    for frames in streams.values():
+        # Records are written as answers finish; send them in the order the frames arrived
+        frames.sort(key=lambda record: record.timestamp)
+    if not streams:
+        print(f"{args.recording} contains no frames.")
+        return 1
+
+    from app import app, socketio
+    from session_cache import issue_socket_token
+    auth = {'token': issue_socket_token(app.config['SECRET_KEY'], args.user_id)} if args.user_id else {}
+
+    clients = [ReplayClient(app, socketio, frames, args.speed, args.timeout, auth, args.event)
+               for frames in streams.values() for _ in range(max(1, args.clients))]
+    # Every simulated client shares the same start so the recorded interleaving of streams is kept
+    start_at = time.perf_counter() + 0.1
+    for client in clients:
+        client.start_at = start_at
+        client.start()
+    for client in clients:
+        client.join()
+    wall_time = time.perf_counter() - start_at
+
+    report = summarize([r for client in clients for r in client.results], wall_time, args.timeout)
+    report.update(recording=args.recording, event=args.event, speed=args.speed, clients=len(clients))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Replayed {report['frames']} frames from {len(clients)} clients in {report['wall_time_s']}s "
+              f"({report['fps']} fps, speed {args.speed or 'max'})")
+        print("Latency ms: " + ", ".join(f"{k} {v}" for k, v in report['latency_ms'].items()))
+        print("Dropped: " + ", ".join(f"{k} {v}" for k, v in report['dropped'].items()))
+        if 'faces_per_frame' in report:
+            print(f"Faces per frame: mean {report['faces_per_frame']['mean']}, max {report['faces_per_frame']['max']}")
+        agreement = report['label_agreement']
+        print(f"Label agreement: {'n/a' if agreement is None else f'{agreement:.1%}'}")
+        for pair, count in report['top_mismatches'].items():
+            print(f"  {pair}: {count}")
+
+    if args.min_agreement is not None and (report['label_agreement'] or 0.0) < args.min_agreement:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
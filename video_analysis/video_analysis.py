@@ -5,6 +5,7 @@ import cv2
 import numpy as np
 from tensorflow.keras.models import load_model 
 from tensorflow.keras.preprocessing.image import img_to_array
+from metrics import VIDEO_STAGE_LATENCY
 
 warnings.filterwarnings("ignore")
 
@@ -30,6 +31,14 @@ except Exception as e:
     FACE_CLASSIFIER = None
     VIDEO_CLASSIFIER = None
 
+def decode_frame(base64_frame: str):
+    """Decodes a Base64 data-URL frame into a BGR image; None if it is not a valid image."""
+    with VIDEO_STAGE_LATENCY.time(stage='decode'):
+        base64_decoded = base64_frame.split(',')[1]
+        img_bytes = base64.b64decode(base64_decoded)
+        nparr = np.frombuffer(img_bytes, np.uint8)
+        return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
 def analyze_video_frame(base64_frame: str) -> str:
     """
     Analyzes a single Base64-encoded frame to detect the dominant emotion.
@@ -39,17 +48,15 @@ def analyze_video_frame(base64_frame: str) -> str:
 
     try:
         # 1. Decode Base64 string into NumPy array (image)
-        base64_decoded = base64_frame.split(',')[1]
-        img_bytes = base64.b64decode(base64_decoded)
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        frame = decode_frame(base64_frame)
 
         if frame is None:
             return 'Neutral'
 
         # 2. Preprocess
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = FACE_CLASSIFIER.detectMultiScale(gray, 1.3, 5)
+        with VIDEO_STAGE_LATENCY.time(stage='detect'):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            faces = FACE_CLASSIFIER.detectMultiScale(gray, 1.3, 5)
         
         if len(faces) == 0:
             return 'Neutral' 
@@ -62,7 +69,8 @@ def analyze_video_frame(base64_frame: str) -> str:
         if roi_gray.size == 0:
             return 'Neutral'
             
-        roi_gray = cv2.resize(roi_gray, (48, 48), interpolation=cv2.INTER_AREA)
+        with VIDEO_STAGE_LATENCY.time(stage='preprocess'):
+            roi_gray = cv2.resize(roi_gray, (48, 48), interpolation=cv2.INTER_AREA)
 
         # 3. Normalize and Predict
         if np.sum([roi_gray]) != 0:
@@ -73,7 +81,8 @@ def analyze_video_frame(base64_frame: str) -> str:
             roi = np.expand_dims(roi, axis=-1) 
             roi = np.expand_dims(roi, axis=0)
 
-            prediction = VIDEO_CLASSIFIER.predict(roi, verbose=0)[0]
+            with VIDEO_STAGE_LATENCY.time(stage='predict'):
+                prediction = VIDEO_CLASSIFIER.predict(roi, verbose=0)[0]
             
             # Determine Dominant Emotion
             label_index = prediction.argmax()